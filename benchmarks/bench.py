@@ -0,0 +1,221 @@
+"""pywinos overhead benchmarks.
+
+Remote calls are made against an in-process stub WSMan endpoint, so the
+numbers show the cost of pywinos and pywinrm themselves, not of a real host.
+
+Usage::
+
+    python -m benchmarks.bench
+    python -m benchmarks.bench --output new.json --compare old.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.stub_wsman import StubWSManServer
+from pywinos import ResponseParser, WinOSClient, __version__
+
+
+class StubWinOSClient(WinOSClient):
+    """WinOSClient that sends every remote call to the stub endpoint"""
+
+    def __init__(self, host: str, endpoint: str, **kwargs):
+        kwargs.setdefault('logger_enabled', False)
+        kwargs.setdefault('transport', 'plaintext')
+        kwargs.setdefault('message_encryption', 'never')
+        super().__init__(host, 'bench', 'bench', **kwargs)
+        self.endpoint = endpoint
+
+    def _endpoint(self, ssl: bool) -> str:
+        return self.endpoint
+
+
+def _stats(samples: list, total: float = None) -> dict:
+    """Latency statistics in milliseconds"""
+
+    ordered = sorted(samples)
+    total = total if total is not None else sum(samples)
+    return {
+        'calls': len(samples),
+        'mean_ms': statistics.mean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+        'throughput_per_sec': len(samples) / total if total else 0.0,
+    }
+
+
+def _timeit(func, iterations: int) -> dict:
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return _stats(samples, time.perf_counter() - started)
+
+
+def bench_remote(iterations: int) -> dict:
+    results = {}
+    with StubWSManServer(output=b'stub-host\\administrator\r\n') as stub:
+        client = StubWinOSClient('bench-host', stub.endpoint)
+        results['run_cmd'] = _timeit(lambda: client.run_cmd('whoami'), iterations)
+        results['run_ps'] = _timeit(lambda: client.run_ps('whoami'), iterations)
+    return results
+
+
+def bench_large_output(sizes: list) -> dict:
+    results = {}
+    line = b'The quick brown fox jumps over the lazy dog 0123456789\r\n'
+    for size in sizes:
+        output = (line * (size // len(line) + 1))[:size]
+        with StubWSManServer(output=output, chunk_size=64 * 1024) as stub:
+            client = StubWinOSClient('bench-host', stub.endpoint)
+            results[f'run_ps_{size}'] = _timeit(lambda: client.run_ps('Get-Content big.log'), 5)
+
+        parser = ResponseParser((0, output, b''))
+        results[f'parse_stdout_{size}'] = _timeit(lambda: parser.stdout, 5)
+
+        encoded = base64.b64encode(output)
+        parser = ResponseParser((0, encoded, b''))
+        results[f'parse_decoded_{size}'] = _timeit(lambda: parser.decoded(), 5)
+    return results
+
+
+def bench_fan_out(hosts: int, workers: int, latency: float) -> dict:
+    with StubWSManServer(output=b'ok', latency=latency) as stub:
+        clients = [StubWinOSClient(f'host-{i:04d}', stub.endpoint) for i in range(hosts)]
+
+        def call(client):
+            start = time.perf_counter()
+            client.run_ps('$PSVersionTable.PSVersion')
+            return time.perf_counter() - start
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            samples = list(pool.map(call, clients))
+        total = time.perf_counter() - started
+
+    result = _stats(samples, total)
+    result.update(hosts=hosts, workers=workers, simulated_latency_ms=latency * 1000)
+    return {'fan_out': result}
+
+
+def _generate_tree(root: str, files: int, size: int):
+    for i in range(files):
+        directory = os.path.join(root, f'dir{i % 10}')
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'file{i:05d}.log'), 'wb') as f:
+            f.write(os.urandom(size))
+
+
+def bench_local(files: int) -> dict:
+    results = {}
+    root = tempfile.mkdtemp(prefix='pywinos-bench-')
+    try:
+        tree = os.path.join(root, 'tree')
+        _generate_tree(tree, files, 1024)
+        flat = os.path.join(tree, 'dir0')
+        results['search'] = _timeit(lambda: WinOSClient.search(flat, filter_='file0'), 50)
+
+        big = os.path.join(root, 'big.bin')
+        with open(big, 'wb') as f:
+            f.write(os.urandom(32 * 1024 * 1024))
+        results['get_md5_32mb'] = _timeit(lambda: WinOSClient.get_md5(big), 3)
+
+        archive = os.path.join(root, 'tree.zip')
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+            for directory, _, names in os.walk(tree):
+                for name in names:
+                    full = os.path.join(directory, name)
+                    zip_ref.write(full, os.path.relpath(full, tree))
+
+        target = os.path.join(root, 'unzipped')
+        results['unzip'] = _timeit(lambda: WinOSClient.unzip(archive, target), 3)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def bench_import(runs: int) -> dict:
+    """Time of "python -c 'import pywinos'" over a bare interpreter start"""
+
+    def spawn(code):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code])
+        return time.perf_counter() - start
+
+    bare = statistics.median(spawn('pass') for _ in range(runs))
+    samples = [max(0.0, spawn('import pywinos') - bare) for _ in range(runs)]
+    return {'import': _stats(samples)}
+
+
+def compare(current: dict, baseline: dict) -> list:
+    """Relative change of mean latency between two result files"""
+
+    lines = []
+    for name, stats in sorted(current['results'].items()):
+        old = baseline.get('results', {}).get(name)
+        if not old or not old.get('mean_ms'):
+            continue
+        delta = (stats['mean_ms'] - old['mean_ms']) / old['mean_ms'] * 100
+        lines.append(f'{name:<32} {old["mean_ms"]:>10.3f} -> {stats["mean_ms"]:>10.3f} ms  {delta:+7.1f}%')
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=f'bench-{__version__}.json', help='JSON file to save results to')
+    parser.add_argument('--compare', help='Previous results file to compare with')
+    parser.add_argument('--iterations', type=int, default=200, help='Calls per latency benchmark')
+    parser.add_argument('--hosts', type=int, default=200, help='Simulated hosts for fan-out')
+    parser.add_argument('--workers', type=int, default=32, help='Threads for fan-out')
+    parser.add_argument('--latency', type=float, default=0.005, help='Simulated per-request latency, sec')
+    parser.add_argument('--files', type=int, default=2000, help='Files in the generated tree')
+    parser.add_argument('--import-runs', type=int, default=20, help='Interpreter starts for import benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1024 * 1024, 16 * 1024 * 1024],
+                        help='Output sizes for decoding benchmarks, bytes')
+    args = parser.parse_args(argv)
+
+    results = {}
+    results.update(bench_import(args.import_runs))
+    results.update(bench_remote(args.iterations))
+    results.update(bench_large_output(args.sizes))
+    results.update(bench_fan_out(args.hosts, args.workers, args.latency))
+    results.update(bench_local(args.files))
+
+    report = {
+        'version': __version__,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'results': results,
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, stats in sorted(results.items()):
+        print(f'{name:<32} mean {stats["mean_ms"]:>10.3f} ms  p95 {stats["p95_ms"]:>10.3f} ms  '
+              f'{stats["throughput_per_sec"]:>10.1f}/s')
+    print('Saved to', args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print('\n'.join(compare(report, json.load(f))))
+
+
+if __name__ == '__main__':
+    main()
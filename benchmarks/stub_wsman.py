@@ -0,0 +1,211 @@
+"""In-process stub WSMan endpoint.
+
+Speaks just enough of the WinRM shell protocol (Create, Command, Receive,
+Signal, Delete) for pywinrm to run commands against it. Authentication is
+not checked, so clients must use the "plaintext" transport with message
+encryption disabled.
+"""
+
+import base64
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+_ACTION = re.compile(r'<a:Action[^>]*>([^<]+)</a:Action>')
+_MESSAGE_ID = re.compile(r'<a:MessageID>([^<]+)</a:MessageID>')
+_COMMAND_ID = re.compile(r'CommandId="([^"]+)"')
+_COMMAND = re.compile(r'<rsp:Command>([^<]*)</rsp:Command>')
+_SIGNAL = re.compile(r'<rsp:Code>([^<]+)</rsp:Code>')
+_OPERATION_TIMEOUT = re.compile(r'<w:OperationTimeout>PT(\d+(?:\.\d+)?)S</w:OperationTimeout>')
+
+_ENVELOPE = (
+    '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope" '
+    'xmlns:a="http://schemas.xmlsoap.org/ws/2004/08/addressing" '
+    'xmlns:w="http://schemas.dmtf.org/wbem/wsman/1/wsman.xsd" '
+    'xmlns:rsp="http://schemas.microsoft.com/wbem/wsman/1/windows/shell">'
+    '<s:Header><a:RelatesTo>{relates_to}</a:RelatesTo></s:Header>'
+    '<s:Body>{body}</s:Body></s:Envelope>'
+)
+
+_TIMEOUT_FAULT = (
+    '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope" '
+    'xmlns:f="http://schemas.microsoft.com/wbem/wsman/1/wsmanfault">'
+    '<s:Body><s:Fault><s:Code><s:Value>s:Receiver</s:Value></s:Code>'
+    '<s:Reason><s:Text xml:lang="en-US">The WS-Management service cannot '
+    'complete the operation within the time specified in OperationTimeout.'
+    '</s:Text></s:Reason><s:Detail>'
+    '<f:WSManFault Code="2150858793" Machine="stub"/>'
+    '</s:Detail></s:Fault></s:Body></s:Envelope>'
+)
+
+_DONE = 'http://schemas.microsoft.com/wbem/wsman/1/windows/shell/CommandState/Done'
+_RUNNING = 'http://schemas.microsoft.com/wbem/wsman/1/windows/shell/CommandState/Running'
+
+
+class _Command:
+    def __init__(self, line: str, chunks: list, exit_code: int, duration: float):
+        self.line = line
+        self.chunks = chunks
+        self.exit_code = exit_code
+        self.finish_at = time.monotonic() + duration
+        self.signals = []
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.signals) or time.monotonic() >= self.finish_at
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        stub = self.server.stub
+
+        if not body:  # Connection probe, nothing to answer
+            return self._reply(200, b'')
+
+        action = _ACTION.search(body).group(1).rsplit('/', 1)[-1]
+        stub.requests[action] += 1
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        handler = getattr(self, '_' + action.lower())
+        status, payload = handler(stub, body)
+        self._reply(status, payload.encode('utf-8'))
+
+    def _reply(self, status: int, payload: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/soap+xml;charset=UTF-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    @staticmethod
+    def _envelope(body: str, request: str = '') -> str:
+        match = _MESSAGE_ID.search(request)
+        return _ENVELOPE.format(relates_to=match.group(1) if match else '', body=body)
+
+    def _create(self, stub, body):
+        shell_id = str(uuid.uuid4()).upper()
+        return 200, self._envelope(
+            '<x:ResourceCreated xmlns:x="http://schemas.xmlsoap.org/ws/2004/09/transfer">'
+            '<a:ReferenceParameters><w:SelectorSet>'
+            f'<w:Selector Name="ShellId">{shell_id}</w:Selector>'
+            '</w:SelectorSet></a:ReferenceParameters></x:ResourceCreated>',
+            body)
+
+    def _command(self, stub, body):
+        command_id = str(uuid.uuid4()).upper()
+        line = _COMMAND.search(body).group(1)
+        stub.commands[command_id] = _Command(line, stub.chunks(), stub.exit_code, stub.duration)
+        return 200, self._envelope(
+            f'<rsp:CommandResponse><rsp:CommandId>{command_id}</rsp:CommandId></rsp:CommandResponse>',
+            body)
+
+    def _receive(self, stub, body):
+        command_id = _COMMAND_ID.search(body).group(1)
+        command = stub.commands[command_id]
+
+        if not command.finished:
+            timeout = float(_OPERATION_TIMEOUT.search(body).group(1))
+            time.sleep(max(0.0, min(timeout, command.finish_at - time.monotonic())))
+            if not command.finished:
+                return 500, _TIMEOUT_FAULT
+
+        streams = ''
+        if command.chunks:
+            chunk = base64.b64encode(command.chunks.pop(0)).decode('ascii')
+            streams = f'<rsp:Stream Name="stdout" CommandId="{command_id}">{chunk}</rsp:Stream>'
+
+        if command.chunks:
+            state = f'<rsp:CommandState CommandId="{command_id}" State="{_RUNNING}"/>'
+        else:
+            state = (f'<rsp:CommandState CommandId="{command_id}" State="{_DONE}">'
+                     f'<rsp:ExitCode>{command.exit_code}</rsp:ExitCode></rsp:CommandState>')
+        return 200, self._envelope(
+            f'<rsp:ReceiveResponse>{streams}{state}</rsp:ReceiveResponse>', body)
+
+    def _signal(self, stub, body):
+        command = stub.commands.get(_COMMAND_ID.search(body).group(1))
+        if command is not None:
+            command.signals.append(_SIGNAL.search(body).group(1).rsplit('/', 1)[-1])
+        return 200, self._envelope('<rsp:SignalResponse/>', body)
+
+    def _delete(self, stub, body):
+        stub.requests['shells_closed'] += 1
+        return 200, self._envelope('', body)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StubWSManServer:
+    """Local WSMan endpoint answering every command with a canned output.
+
+    :param output: Bytes returned as stdout of every command
+    :param exit_code: Exit code reported for every command
+    :param chunk_size: Split stdout into several Receive responses of this size
+    :param latency: Seconds to sleep before answering every request
+    :param duration: Seconds every command "runs" before it is done
+    """
+
+    def __init__(self,
+                 output: bytes = b'',
+                 exit_code: int = 0,
+                 chunk_size: int = 0,
+                 latency: float = 0.0,
+                 duration: float = 0.0):
+        self.output = output
+        self.exit_code = exit_code
+        self.chunk_size = chunk_size
+        self.latency = latency
+        self.duration = duration
+        self.requests = Counter()
+        self.commands = {}
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def endpoint(self) -> str:
+        return f'http://127.0.0.1:{self.port}/wsman'
+
+    def chunks(self) -> list:
+        if not self.output:
+            return []
+        size = self.chunk_size or len(self.output)
+        return [self.output[i:i + size] for i in range(0, len(self.output), size)]
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -1,9 +1,47 @@
+from pywinos.cache import ResultCache
+from pywinos.events import EventQuery
+from pywinos.facts import HostFacts
+from pywinos.facts import diff_fleet
+from pywinos.filecopy import CopyVerificationError
+from pywinos.follow import LogFollower
+from pywinos.health import CircuitBreaker
+from pywinos.health import HostUnavailableError
+from pywinos.jobs import LocalJob
+from pywinos.jobs import RemoteJob
+from pywinos.jobs import wait_jobs
+from pywinos.metrics import CommandMetrics
+from pywinos.metrics import MetricsCollector
+from pywinos.pshost import PowerShellHost
+from pywinos.pshost import PowerShellPool
+from pywinos.psrp import PSRPPool
 from pywinos.pywinos import ResponseParser
 from pywinos.pywinos import WinOSClient
 from pywinos.pywinos import __version__
+from pywinos.sampler import Sampler
+from pywinos.scheduler import QuotaScheduler
+from pywinos.scripts import ScriptRegistry
 
 __all__ = [
     "WinOSClient",
     "ResponseParser",
+    "CommandMetrics",
+    "MetricsCollector",
+    "ResultCache",
+    "CircuitBreaker",
+    "HostUnavailableError",
+    "RemoteJob",
+    "LocalJob",
+    "wait_jobs",
+    "PowerShellHost",
+    "PowerShellPool",
+    "PSRPPool",
+    "ScriptRegistry",
+    "LogFollower",
+    "HostFacts",
+    "diff_fleet",
+    "QuotaScheduler",
+    "EventQuery",
+    "CopyVerificationError",
+    "Sampler",
     "__version__",
 ]
@@ -0,0 +1,5 @@
+import sys
+
+from pywinos.cli import main
+
+sys.exit(main())
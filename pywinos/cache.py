@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Thread-safe LRU cache of command results with per-entry TTL.
+
+    Keys are tuples starting with the host, so one cache can be shared
+    across clients.
+
+    :param maxsize: Max number of entries. The least recently used entry is evicted first
+    :param ttl: Default time to live of an entry, sec
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def _lookup(self, key):
+        """Return (value,) for a live entry, None otherwise"""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value,
+
+    def get(self, key, default=None):
+        found = self._lookup(key)
+        if found is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return found[0]
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = time.monotonic() + ttl, value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_call(self, key, func, ttl: float = None, store=None):
+        """Return cached value or call func and cache its result.
+
+        :param key: Cache key. (host, ...) tuple
+        :param func: Callable without arguments to get the value
+        :param ttl: Time to live of a new entry, sec. Cache default if None
+        :param store: Predicate to decide whether the result is worth caching
+        """
+
+        found = self._lookup(key)
+        if found is not None:
+            self.hits += 1
+            return found[0]
+
+        self.misses += 1
+        value = func()
+        if store is None or store(value):
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, host: str = None, match: str = None) -> int:
+        """Remove entries. All of them if no criteria specified.
+
+        :param host: Remove entries of this host only
+        :param match: Remove entries which key mentions this text (case-insensitive)
+        :return: Number of entries removed
+        """
+
+        match = match.lower() if match else None
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if (host is None or key[0] == host) and
+                (match is None or match in ' '.join(map(str, key[1:])).lower())
+            ]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
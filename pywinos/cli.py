@@ -0,0 +1,133 @@
+"""Run a command across many hosts and print results as NDJSON.
+
+    pywinos -H hosts.txt -u admin --ps "Get-Service Spooler" -c 32 > results.ndjson
+    cat hosts.txt | pywinos --cmd "ipconfig /all"
+    pywinos --host 10.0.0.1 --host 10.0.0.2 --script audit.ps1 --param Days=7
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from pywinos.pywinos import WinOSClient, __version__
+
+
+def read_hosts(lines) -> iter:
+    """Hosts from lines. Blank lines and # comments are skipped"""
+
+    for line in lines:
+        host = line.split('#', 1)[0].strip()
+        if host:
+            yield host
+
+
+def read_hosts_file(path: str) -> iter:
+    with open(path, encoding='utf-8') as file:
+        yield from read_hosts(file)
+
+
+def parse_args(argv: list = None):
+    parser = argparse.ArgumentParser(
+        prog='pywinos', description='Execute PowerShell or cmd command on many Windows hosts. '
+                                    'Prints one JSON record per host as soon as it finishes.')
+    parser.add_argument('-H', '--hosts', metavar='FILE', default='-', help='Hosts file, one per line. stdin by default')
+    parser.add_argument('--host', action='append', default=[], help='Host. Can be repeated instead of the hosts file')
+    parser.add_argument('-u', '--username', default=os.environ.get('PYWINOS_USERNAME', ''),
+                        help='Username. PYWINOS_USERNAME by default')
+    parser.add_argument('-p', '--password', default=os.environ.get('PYWINOS_PASSWORD', ''),
+                        help='Password. PYWINOS_PASSWORD by default')
+
+    command = parser.add_mutually_exclusive_group(required=True)
+    command.add_argument('--ps', metavar='COMMAND', help='PowerShell command')
+    command.add_argument('--cmd', metavar='COMMAND', help='Command-line command')
+    command.add_argument('--script', metavar='FILE', help='PowerShell script file. Uploaded once per host')
+
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE', help='Script parameter')
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help='Hosts processed at the same time')
+    parser.add_argument('-t', '--timeout', type=int, default=60, help='Command timeout, sec')
+    parser.add_argument('--retries', type=int, default=0, help='Retries of transport errors')
+    parser.add_argument('--compress', action='store_true', help='Gzip PowerShell output on hosts')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log to stderr')
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+
+    args = parser.parse_args(argv)
+    try:
+        args.params = dict(param.split('=', 1) for param in args.param)
+    except ValueError:
+        parser.error('--param must be NAME=VALUE')
+    return args
+
+
+def execute(args, host: str, source: str = None) -> dict:
+    """Run the command on the host
+
+    :return: Result record
+    """
+
+    started = time.monotonic()
+    record = {'host': host, 'ok': False, 'exit_code': None, 'stdout': None, 'stderr': None, 'error': None}
+    try:
+        client = WinOSClient(host, args.username, args.password, logger_enabled=args.verbose,
+                             retries=args.retries, compress_output=args.compress)
+        if args.ps:
+            response = client.run_ps(args.ps, timeout=args.timeout)
+        elif args.cmd:
+            response = client.run_cmd(args.cmd, timeout=args.timeout)
+        else:
+            response = client.run_script(source, timeout=args.timeout, **args.params)
+        record.update(ok=response.ok, exit_code=response.exited, stdout=response.stdout, stderr=response.stderr)
+    except Exception as err:
+        record['error'] = f'{type(err).__name__}: {err}'
+    record['elapsed'] = round(time.monotonic() - started, 3)
+    return record
+
+
+def main(argv: list = None) -> int:
+    args = parse_args(argv)
+
+    source = None
+    if args.script:
+        with open(args.script, encoding='utf-8-sig') as file:
+            source = file.read()
+
+    if args.host:
+        hosts = iter(args.host)
+    elif args.hosts == '-':
+        hosts = read_hosts(sys.stdin)
+    else:
+        hosts = read_hosts_file(args.hosts)
+
+    failed = 0
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        pending = set()
+        for host in hosts:
+            pending.add(executor.submit(execute, args, host, source))
+            if len(pending) < args.concurrency:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            failed += write(done)
+        failed += write(pending)
+
+    return 1 if failed else 0
+
+
+def write(futures) -> int:
+    """Print results of finished futures in completion order
+
+    :return: Number of failed hosts
+    """
+
+    failed = 0
+    for future in as_completed(futures):
+        record = future.result()
+        failed += not record['ok']
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+        sys.stdout.flush()
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(main())
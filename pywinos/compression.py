@@ -0,0 +1,45 @@
+import base64
+
+# Prefix of gzip + base64 encoded stdout
+COMPRESSED_MARKER = b'##PYWINOS-GZIP##'
+
+# Collects stdout of the command, gzips it on the host and prints it base64 encoded.
+# Small outputs are printed as is: compression would not pay off. Status of the
+# command is taken right after it, before Out-String and assignments reset $?.
+_WRAPPER = '''$__o = & {{
+{command}
+Set-Variable -Name __ok -Value $? -Scope 1
+Set-Variable -Name __code -Value $LASTEXITCODE -Scope 1
+}} | Out-String
+$__o = $__o.TrimEnd()
+$__b = [Text.Encoding]::UTF8.GetBytes($__o)
+if ($__b.Length -lt {threshold}) {{ $__o }} else {{
+    $__m = New-Object IO.MemoryStream
+    $__g = New-Object IO.Compression.GZipStream($__m, [IO.Compression.CompressionMode]::Compress)
+    $__g.Write($__b, 0, $__b.Length)
+    $__g.Close()
+    '{marker}' + [Convert]::ToBase64String($__m.ToArray())
+}}
+if ($__code) {{ exit $__code }} elseif (-not $__ok) {{ exit 1 }}'''
+
+
+def compressed_command(command: str, threshold: int = 1024) -> str:
+    """Wrap PowerShell command to return its stdout gzipped.
+
+    :param command: PowerShell command
+    :param threshold: Compress stdout of this number of bytes and more
+    """
+
+    return _WRAPPER.format(command=command, threshold=threshold, marker=COMPRESSED_MARKER.decode('ascii'))
+
+
+def is_compressed(data: bytes) -> bool:
+    return data.lstrip().startswith(COMPRESSED_MARKER)
+
+
+def decompress(data: bytes) -> bytes:
+    """Decode stdout of a compressed command"""
+
+    import gzip
+
+    return gzip.decompress(base64.b64decode(data.strip()[len(COMPRESSED_MARKER):]))
@@ -0,0 +1,148 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from pywinos.scripts import _powershell
+
+LEVELS = {
+    'critical': 1,
+    'error': 2,
+    'warning': 3,
+    'information': 4,
+    'verbose': 5,
+}
+
+# Selects a page of events oldest first and prints them as compact JSON.
+# Get-WinEvent fails when nothing matches, which is an empty page for us.
+_QUERY_SCRIPT = '''$__events = @(try {{
+    Get-WinEvent -LogName {log} -FilterXPath {xpath} -MaxEvents {count} -Oldest -ErrorAction Stop
+}} catch {{
+    if ($_.FullyQualifiedErrorId -notlike 'NoMatchingEventsFound*') {{ throw }}
+}})
+ConvertTo-Json -Compress -InputObject @($__events | ForEach-Object {{ [ordered]@{{
+    RecordId = $_.RecordId; Id = $_.Id; Level = [int]$_.Level; Provider = $_.ProviderName;
+    TimeCreated = $_.TimeCreated.ToUniversalTime().ToString('o'){message}
+}} }})'''
+
+
+def _any(name: str, values: list) -> str:
+    return '(' + ' or '.join(f'{name}={value}' for value in values) + ')'
+
+
+def build_xpath(ids: list = None, levels: list = None, since=None, providers: list = None,
+                after_record: int = None) -> str:
+    """XPath event filter evaluated by the event log service
+
+    :param ids: Event IDs
+    :param levels: Levels as numbers or names: critical, error, warning, information, verbose
+    :param since: datetime (naive is local time) or timedelta back from now
+    :param providers: Provider names
+    :param after_record: Only events with EventRecordID greater than this one
+    """
+
+    conditions = []
+    if ids:
+        conditions.append(_any('EventID', ids))
+    if levels:
+        levels = [LEVELS[level.lower()] if isinstance(level, str) else level for level in levels]
+        if LEVELS['information'] in levels:
+            levels.append(0)  # Classic event sources log information as 0
+        conditions.append(_any('Level', levels))
+    if providers:
+        conditions.append('Provider[' + ' or '.join(f'@Name="{name}"' for name in providers) + ']')
+    if isinstance(since, timedelta):
+        conditions.append(f'TimeCreated[timediff(@SystemTime) <= {int(since.total_seconds() * 1000)}]')
+    elif since is not None:
+        moment = since.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]
+        conditions.append(f"TimeCreated[@SystemTime>='{moment}Z']")
+    if after_record is not None:
+        conditions.append(f'EventRecordID > {after_record}')
+
+    if not conditions:
+        return '*'
+    return f'*[System[{" and ".join(conditions)}]]'
+
+
+class EventQuery:
+    """Paged query of a Windows event log filtered on the host.
+
+    Iterate to stream events oldest first, or call pages() to get them page
+    by page. bookmark is the RecordId of the last event delivered: pass it to
+    a new query to resume where this one stopped.
+
+    :param client: WinOSClient
+    :param log: Log name, e.g. System, Application, Microsoft-Windows-TaskScheduler/Operational
+    :param ids: Event IDs
+    :param levels: Levels as numbers or names: critical, error, warning, information, verbose
+    :param since: datetime or timedelta back from the moment the query is created
+    :param providers: Provider names
+    :param max_events: Stop after this number of events. All matching events if None
+    :param page_size: Events per remote call
+    :param bookmark: Start after the event with this RecordId
+    :param include_message: Render event messages. Costs CPU on the host
+    """
+
+    def __init__(self, client, log: str = 'System', ids: list = None, levels: list = None, since=None,
+                 providers: list = None, max_events: int = None, page_size: int = 500, bookmark: int = None,
+                 include_message: bool = True):
+        self.client = client
+        self.log = log
+        self.ids = ids
+        self.levels = levels
+        if isinstance(since, timedelta):  # Fixed once, so the window does not move between pages
+            since = datetime.now(timezone.utc) - since
+        self.since = since
+        self.providers = providers
+        self.max_events = max_events
+        self.page_size = page_size
+        self.bookmark = bookmark
+        self.include_message = include_message
+        self.fetched = 0
+        self._after = bookmark
+        self._exhausted = False
+
+    def command(self) -> str:
+        """Command to fetch the next page"""
+
+        count = self.page_size
+        if self.max_events is not None:
+            count = min(count, self.max_events - self.fetched)
+        xpath = build_xpath(self.ids, self.levels, self.since, self.providers, self._after)
+        return _QUERY_SCRIPT.format(
+            log=_powershell(self.log), xpath=_powershell(xpath), count=count,
+            message='; Message = $_.Message' if self.include_message else '')
+
+    def next_page(self) -> list:
+        """Fetch the next page of events. Empty list when there are no more"""
+
+        if self._exhausted or (self.max_events is not None and self.fetched >= self.max_events):
+            return []
+
+        response = self.client.run_ps(self.command(), compress=True)
+        if not response.ok:
+            raise RuntimeError(f'Cannot query {self.log} events on {self.client.host}: {response.stderr}')
+
+        events = json.loads(response.stdout) if response.stdout else []
+        self.fetched += len(events)
+        self._exhausted = len(events) < self.page_size
+        if events:
+            self._after = events[-1]['RecordId']
+        return events
+
+    def pages(self):
+        """Yield pages of events. bookmark moves to the end of every page yielded"""
+
+        while True:
+            page = self.next_page()
+            if not page:
+                return
+            self.bookmark = page[-1]['RecordId']
+            yield page
+
+    def __iter__(self):
+        while True:
+            page = self.next_page()
+            if not page:
+                return
+            for event in page:
+                self.bookmark = event['RecordId']
+                yield event
@@ -0,0 +1,182 @@
+import json
+import os
+import time
+
+# PowerShell expression per category. Values are converted to strings where
+# ConvertTo-Json would produce objects or "\/Date()\/" otherwise.
+CATEGORIES = {
+    'os': "Get-CimInstance Win32_OperatingSystem | Select-Object Caption, Version, BuildNumber, OSArchitecture, "
+          "CSName, @{n='LastBootUpTime'; e={$_.LastBootUpTime.ToString('o')}}",
+    'hotfixes': "Get-HotFix | Select-Object HotFixID, Description, "
+                "@{n='InstalledOn'; e={if ($_.InstalledOn) {$_.InstalledOn.ToString('yyyy-MM-dd')}}}",
+    'disks': "Get-CimInstance Win32_LogicalDisk -Filter 'DriveType=3' | "
+             "Select-Object DeviceID, FileSystem, VolumeName, Size, FreeSpace",
+    'services': "Get-Service | Select-Object Name, DisplayName, "
+                "@{n='Status'; e={[string]$_.Status}}, @{n='StartType'; e={[string]$_.StartType}}",
+    'processes': "Get-Process | Select-Object Name, Id, Path, WorkingSet64",
+    'network': "Get-CimInstance Win32_NetworkAdapterConfiguration -Filter 'IPEnabled=True' | "
+               "Select-Object Description, MACAddress, IPAddress, IPSubnet, DefaultIPGateway, DNSServerSearchOrder",
+}
+
+# Fields identifying an item of a category in diffs. Keys of several fields are joined with "/"
+KEYS = {
+    'hotfixes': 'HotFixID',
+    'disks': 'DeviceID',
+    'services': 'Name',
+    'processes': ('Name', 'Id'),
+    'network': 'MACAddress',
+}
+
+# Fields changing all the time, ignored in diffs
+VOLATILE = {
+    'os': ('LastBootUpTime',),
+    'disks': ('FreeSpace',),
+    'processes': ('WorkingSet64',),
+}
+
+
+def facts_script(categories: list) -> str:
+    """Single script collecting all categories as compact JSON {facts, errors}"""
+
+    # Non-terminating errors, e.g. access denied, must reach the catch blocks
+    lines = ["$ErrorActionPreference = 'Stop'", '$__facts = @{}', '$__errors = @{}']
+    for name in categories:
+        expression = CATEGORIES[name]
+        value = expression if name == 'os' else f'@({expression})'
+        lines.append(f"try {{ $__facts['{name}'] = {value} }} catch {{ $__errors['{name}'] = $_.Exception.Message }}")
+    lines.append("ConvertTo-Json -InputObject @{facts = $__facts; errors = $__errors} -Depth 4 -Compress")
+    return '\n'.join(lines)
+
+
+class HostFacts:
+    """Facts snapshot of a single host
+
+    :param host: Host
+    :param facts: Category name to collected value
+    :param errors: Category name to error message for categories failed
+    :param collected_at: Epoch time of collection
+    """
+
+    def __init__(self, host: str, facts: dict, errors: dict = None, collected_at: float = None):
+        self.host = host
+        self.facts = facts
+        self.errors = errors or {}
+        self.collected_at = time.time() if collected_at is None else collected_at
+
+    def __repr__(self):
+        return f'<HostFacts {self.host} [{", ".join(self.facts)}]>'
+
+    @property
+    def os(self) -> dict:
+        return self.facts.get('os') or {}
+
+    @property
+    def hotfixes(self) -> list:
+        return self.facts.get('hotfixes', [])
+
+    @property
+    def disks(self) -> list:
+        return self.facts.get('disks', [])
+
+    @property
+    def services(self) -> list:
+        return self.facts.get('services', [])
+
+    @property
+    def processes(self) -> list:
+        return self.facts.get('processes', [])
+
+    @property
+    def network(self) -> list:
+        return self.facts.get('network', [])
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.collected_at
+
+    def as_dict(self) -> dict:
+        return {'host': self.host, 'collected_at': self.collected_at, 'facts': self.facts, 'errors': self.errors}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data['host'], data['facts'], data.get('errors'), data.get('collected_at'))
+
+    def save(self, path: str):
+        """Write snapshot as JSON. Atomic: readers never see a partial file"""
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        part = f'{path}.{os.getpid()}.part'
+        with open(part, 'w', encoding='utf-8') as file:
+            json.dump(self.as_dict(), file, separators=(',', ':'))
+        os.replace(part, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, encoding='utf-8') as file:
+            return cls.from_dict(json.load(file))
+
+    @staticmethod
+    def _items(category: str, value) -> dict:
+        """Key to item without volatile fields"""
+
+        volatile = VOLATILE.get(category, ())
+        fields = KEYS.get(category)
+        if fields is None:
+            value = [value] if value else []
+        items = {}
+        for item in value:
+            if fields is None:
+                key = category
+            elif isinstance(fields, tuple):
+                key = '/'.join(str(item.get(field)) for field in fields)
+            else:
+                key = item.get(fields)
+            items[key] = {field: data for field, data in item.items() if field not in volatile}
+        return items
+
+    def diff(self, other) -> dict:
+        """Differences from other snapshot, e.g. the previous one or another host.
+
+        :return: {category: {'added': [keys], 'removed': [keys], 'changed': {key: {field: (other, self)}}}}.
+            Only categories with differences collected in both snapshots
+        """
+
+        result = {}
+        for category in self.facts.keys() & other.facts.keys():
+            old, new = self._items(category, other.facts[category]), self._items(category, self.facts[category])
+            changed = {}
+            for key in old.keys() & new.keys():
+                fields = {
+                    field: (old[key].get(field), new[key].get(field))
+                    for field in old[key].keys() | new[key].keys()
+                    if old[key].get(field) != new[key].get(field)
+                }
+                if fields:
+                    changed[key] = fields
+
+            added, removed = sorted(new.keys() - old.keys(), key=str), sorted(old.keys() - new.keys(), key=str)
+            if added or removed or changed:
+                result[category] = {'added': added, 'removed': removed, 'changed': changed}
+        return result
+
+
+def diff_fleet(snapshots: list, baseline: HostFacts = None) -> dict:
+    """Compare snapshots of many hosts with a baseline
+
+    :param snapshots: HostFacts list
+    :param baseline: Reference snapshot. The first one if not specified
+    :return: {host: diff} for hosts differing from the baseline
+    """
+
+    if not snapshots:
+        return {}
+    baseline = baseline or snapshots[0]
+    result = {}
+    for snapshot in snapshots:
+        if snapshot is baseline:
+            continue
+        diff = snapshot.diff(baseline)
+        if diff:
+            result[snapshot.host] = diff
+    return result
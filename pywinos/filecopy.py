@@ -0,0 +1,180 @@
+import errno
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Kernel refuses zero-copy for these file systems or file pairs: fall back to read/write
+_NO_ZERO_COPY = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, getattr(errno, 'ENOTSUP', None),
+}
+_BINARY = getattr(os, 'O_BINARY', 0)
+
+
+class CopyVerificationError(OSError):
+    """Raised when the copy differs from the source"""
+
+
+def _has_sendfile() -> bool:
+    # Other systems accept sockets only as sendfile destination
+    return hasattr(os, 'sendfile') and sys.platform.startswith('linux')
+
+
+def zero_copy_method() -> str:
+    """Kernel copy available here: copy_file_range, sendfile or None"""
+
+    if hasattr(os, 'copy_file_range'):
+        return 'copy_file_range'
+    if _has_sendfile():
+        return 'sendfile'
+    return None
+
+
+def _preallocate(fd: int, size: int):
+    """Reserve destination size, so streams write into place without extending the file"""
+
+    os.ftruncate(fd, size)
+    if size and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            pass  # Not supported by the file system, e.g. some SMB mounts. The file is sized anyway
+
+
+def _ranges(size: int, streams: int, align: int) -> list:
+    """Split [0, size) into contiguous (offset, length) parts aligned to align bytes"""
+
+    part = -(-size // streams)
+    part = -(-part // align) * align if part else 0
+    return [(offset, min(part, size - offset)) for offset in range(0, size, part)] if part else []
+
+
+def _copy_range(source: str, destination: str, offset: int, length: int, buffer_size: int,
+                method: str, report):
+    src = os.open(source, os.O_RDONLY | _BINARY)
+    try:
+        dst = os.open(destination, os.O_WRONLY | _BINARY)
+        try:
+            reader = os.fdopen(src, 'rb', buffering=0, closefd=False)
+            buffer = None
+            position, end = offset, offset + length
+            while position < end:
+                count = min(buffer_size, end - position)
+                try:
+                    if method == 'copy_file_range':
+                        copied = os.copy_file_range(src, dst, count, position, position)
+                    elif method == 'sendfile':
+                        os.lseek(dst, position, os.SEEK_SET)
+                        copied = os.sendfile(dst, src, position, count)
+                    else:
+                        if buffer is None:
+                            buffer = memoryview(bytearray(buffer_size))
+                        os.lseek(src, position, os.SEEK_SET)
+                        copied = reader.readinto(buffer[:count])
+                        os.lseek(dst, position, os.SEEK_SET)
+                        written = 0
+                        while written < copied:
+                            written += os.write(dst, buffer[written:copied])
+                except OSError as err:
+                    if method is None or err.errno not in _NO_ZERO_COPY:
+                        raise err
+                    method = 'sendfile' if method == 'copy_file_range' and _has_sendfile() else None
+                    continue
+
+                if not copied:
+                    raise OSError(errno.EIO, f'{source} was truncated during copy')
+                position += copied
+                report(copied)
+        finally:
+            os.close(dst)
+    finally:
+        os.close(src)
+
+
+def file_digest(path: str, buffer_size: int = 8 * 1024 * 1024) -> str:
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, 'rb', buffering=0) as file:
+        buffer = memoryview(bytearray(buffer_size))
+        while True:
+            size = file.readinto(buffer)
+            if not size:
+                return digest.hexdigest()
+            digest.update(buffer[:size])
+
+
+def copy_large(source: str, destination: str, streams: int = 4, buffer_size: int = 8 * 1024 * 1024,
+               progress=None, verify: bool = False, zero_copy: bool = True) -> int:
+    """Copy large file, e.g. to a mounted network share, at link speed.
+
+    The copy is preallocated as <destination>.part and filled by several
+    streams writing different parts of it at the same time. Every stream uses
+    kernel copy (copy_file_range/sendfile) where available and read/write
+    otherwise. The destination is replaced once all streams finished and the
+    copy is verified. The part file is removed if the copy fails.
+
+    :param source: Source file
+    :param destination: Destination file or directory
+    :param streams: Parallel streams. 1 to copy sequentially
+    :param buffer_size: Bytes per read/write or kernel copy call
+    :param progress: Callable(copied, total) called as bytes are copied
+    :param verify: Compare SHA-256 of the source and the copy. Raise CopyVerificationError if they differ
+    :param zero_copy: Use kernel copy if available
+    :return: Bytes copied
+    """
+
+    if os.path.isdir(destination):
+        destination = os.path.join(destination, os.path.basename(source))
+
+    size = os.path.getsize(source)
+    part = destination + '.part'  # The destination is replaced only by a complete and verified copy
+    fd = os.open(part, os.O_WRONLY | os.O_CREAT | _BINARY, 0o644)
+    try:
+        _preallocate(fd, size)
+    finally:
+        os.close(fd)
+
+    lock = threading.Lock()
+    copied = [0]
+
+    def report(count: int):
+        with lock:
+            copied[0] += count
+            if progress is not None:
+                progress(copied[0], size)
+
+    try:
+        method = zero_copy_method() if zero_copy else None
+        ranges = _ranges(size, max(1, streams), buffer_size)
+        if len(ranges) <= 1:
+            for offset, length in ranges:
+                _copy_range(source, part, offset, length, buffer_size, method, report)
+        else:
+            with ThreadPoolExecutor(len(ranges)) as executor:
+                futures = [
+                    executor.submit(_copy_range, source, part, offset, length, buffer_size, method, report)
+                    for offset, length in ranges
+                ]
+                for future in futures:
+                    future.result()
+
+        try:
+            shutil.copymode(source, part)
+        except OSError:
+            pass  # Shares may not support permission bits
+
+        if verify:
+            with ThreadPoolExecutor(2) as executor:
+                expected, actual = executor.map(lambda path: file_digest(path, buffer_size), (source, part))
+            if expected != actual:
+                raise CopyVerificationError(errno.EIO, f'{destination} differs from {source}')
+        os.replace(part, destination)
+    except BaseException:
+        try:
+            os.unlink(part)
+        except OSError:
+            pass
+        raise
+    return copied[0]
@@ -0,0 +1,226 @@
+import base64
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from pywinos.logs import logger
+from pywinos.scripts import _powershell
+
+LogLine = namedtuple('LogLine', 'host path line')
+
+_HEAD_SIZE = 64
+
+# Reads files listed in $__cursors from the requested offsets in one call.
+# Starts from 0 if the file was replaced (creation time or first bytes differ)
+# or truncated, from the end if the offset is -1.
+_POLL_SCRIPT = r'''
+$__result = foreach ($__c in (ConvertFrom-Json $__cursors)) {
+    try {
+        $__f = [IO.File]::Open($__c.p, 'Open', 'Read', 'ReadWrite, Delete')
+    } catch {
+        $__e = $_.Exception
+        if ($__e.InnerException) { $__e = $__e.InnerException }
+        @{p = $__c.p; e = $__e.Message; n = $__e -is [IO.FileNotFoundException] -or $__e -is [IO.DirectoryNotFoundException]}
+        continue
+    }
+    try {
+        $__id = [string][IO.File]::GetCreationTimeUtc($__c.p).Ticks
+        $__length = $__f.Length
+        $__head = New-Object byte[] ([Math]::Min(__HEAD_SIZE__, $__length))
+        $__read = $__f.Read($__head, 0, $__head.Length)
+        $__old = [Convert]::FromBase64String($__c.h)
+        $__same = $__read -ge $__old.Length -and ([Convert]::ToBase64String($__head, 0, $__old.Length) -eq $__c.h)
+        $__start = [long]$__c.o
+        $__rotated = $__start -gt 0 -and ($__c.i -ne $__id -or $__length -lt $__start -or -not $__same)
+        if ($__start -lt 0) { $__start = $__length }
+        if ($__rotated) { $__start = 0 }
+        $__data = New-Object byte[] ([Math]::Min([long]$__c.m, $__length - $__start))
+        [void]$__f.Seek($__start, 'Begin')
+        $__got = 0
+        while ($__got -lt $__data.Length) {
+            $__n = $__f.Read($__data, $__got, $__data.Length - $__got)
+            if ($__n -le 0) { break }
+            $__got += $__n
+        }
+        @{p = $__c.p; i = $__id; s = $__start; r = $__rotated; h = [Convert]::ToBase64String($__head, 0, $__read);
+          d = [Convert]::ToBase64String($__data, 0, $__got)}
+    } finally {
+        $__f.Close()
+    }
+}
+ConvertTo-Json -InputObject @($__result) -Compress
+'''.replace('__HEAD_SIZE__', str(_HEAD_SIZE))
+
+
+class FileCursor:
+    """Read position in a followed file
+
+    :param path: File path
+    :param offset: Next byte to read. -1 to start from the end of the file
+    """
+
+    def __init__(self, path: str, offset: int = -1):
+        self.path = path
+        self.offset = offset
+        self.identity = ''
+        self.head = b''
+        self.partial = b''
+        self.rotations = 0
+
+    def __repr__(self):
+        return f'<FileCursor {self.path!r} offset={self.offset} rotations={self.rotations}>'
+
+    def request(self, max_bytes: int) -> dict:
+        return {
+            'p': self.path,
+            'o': self.offset,
+            'i': self.identity,
+            'h': base64.b64encode(self.head).decode('ascii'),
+            'm': max_bytes,
+        }
+
+    def missing(self):
+        """File does not exist: read it from the beginning once it appears"""
+
+        self.offset = 0
+        self.identity = ''
+        self.head = b''
+
+    def advance(self, identity: str, start: int, head: bytes, data: bytes, rotated: bool) -> list:
+        """Move cursor past data read from start. Returns complete lines as bytes"""
+
+        lines = []
+        if rotated:
+            self.rotations += 1
+            if self.partial:
+                lines.append(self.partial)
+            self.partial = b''
+
+        self.identity, self.head, self.offset = identity, head, start + len(data)
+        *complete, self.partial = (self.partial + data).split(b'\n')
+        return lines + [line.rstrip(b'\r') for line in complete]
+
+
+def read_local(cursor: FileCursor, max_bytes: int) -> tuple:
+    """Same as the remote poll script for a local file
+
+    :return: (identity, start, head, data, rotated)
+    """
+
+    with open(cursor.path, 'rb') as file:
+        stat = os.fstat(file.fileno())
+        identity = f'{stat.st_dev}:{stat.st_ino}'
+        head = file.read(_HEAD_SIZE)
+        start = cursor.offset
+        rotated = start > 0 and (
+            identity != cursor.identity or stat.st_size < start or not head.startswith(cursor.head))
+        if start < 0:
+            start = stat.st_size
+        if rotated:
+            start = 0
+        file.seek(start)
+        return identity, start, head, file.read(max_bytes), rotated
+
+
+class LogFollower:
+    """Follow appended lines of local and remote files.
+
+    Remembers offset and identity of every file, so only new bytes are read.
+    A file replaced by rotation or truncated is read from the beginning.
+    All files of a host are read in one call per poll, hosts are polled concurrently.
+
+    :param from_start: Read existing content of files added. Only new lines otherwise
+    :param max_bytes: Max bytes read from a file per poll
+    :param encoding: Files encoding
+    :param workers: Max hosts polled at the same time
+    """
+
+    def __init__(self, from_start: bool = False, max_bytes: int = 1024 * 1024,
+                 encoding: str = 'utf-8', workers: int = 8):
+        self.from_start = from_start
+        self.max_bytes = max_bytes
+        self.encoding = encoding
+        self.workers = workers
+        self.clients = {}
+        self.cursors = {}
+
+    def add(self, client, path: str):
+        """Follow path on the host of the client"""
+
+        self.clients[client.host] = client
+        self.cursors.setdefault(client.host, {})[path] = FileCursor(path, 0 if self.from_start else -1)
+        return self
+
+    def remove(self, client, path: str):
+        self.cursors.get(client.host, {}).pop(path, None)
+
+    def _poll_local(self, cursors: list) -> list:
+        lines = []
+        for cursor in cursors:
+            try:
+                chunk = read_local(cursor, self.max_bytes)
+            except FileNotFoundError:
+                cursor.missing()
+                continue
+            except OSError as err:
+                logger.debug('Cannot read %s: %s', cursor.path, err)
+                continue
+            lines.extend((cursor.path, line) for line in cursor.advance(*chunk))
+        return lines
+
+    def _poll_remote(self, client, cursors: list) -> list:
+        requests = json.dumps([cursor.request(self.max_bytes) for cursor in cursors])
+        response = client.run_ps(f'$__cursors = {_powershell(requests)}\n{_POLL_SCRIPT}')
+        if not response.ok:
+            client.logger.error('[%s] Cannot follow files: %s', client.host, response.stderr)
+            return []
+
+        lines = []
+        by_path = {cursor.path: cursor for cursor in cursors}
+        for item in json.loads(response.stdout):
+            cursor = by_path[item['p']]
+            if 'e' in item:
+                if item.get('n'):
+                    cursor.missing()
+                client.logger.debug('[%s] Cannot read %s: %s', client.host, cursor.path, item['e'])
+                continue
+            chunk = cursor.advance(
+                item['i'], item['s'], base64.b64decode(item['h']), base64.b64decode(item['d']), item['r'])
+            lines.extend((cursor.path, line) for line in chunk)
+        return lines
+
+    def _poll_host(self, host: str) -> list:
+        client = self.clients[host]
+        cursors = list(self.cursors[host].values())
+        try:
+            if not client.host or client.host in ('localhost', '127.0.0.1'):
+                lines = self._poll_local(cursors)
+            else:
+                lines = self._poll_remote(client, cursors)
+        except Exception as err:
+            client.logger.error('[%s] Cannot follow files: %s', host, err)
+            return []
+        return [LogLine(host, path, line.decode(self.encoding, errors='replace')) for path, line in lines]
+
+    def poll(self) -> list:
+        """Read new lines of all files once
+
+        :return: LogLine(host, path, line) list
+        """
+
+        hosts = [host for host, cursors in self.cursors.items() if cursors]
+        if len(hosts) <= 1:
+            return [line for host in hosts for line in self._poll_host(host)]
+
+        with ThreadPoolExecutor(min(self.workers, len(hosts))) as executor:
+            return [line for lines in executor.map(self._poll_host, hosts) for line in lines]
+
+    def follow(self, interval: float = 1.0):
+        """Yield LogLine(host, path, line) as lines are appended. Polls every interval sec"""
+
+        while True:
+            started = time.monotonic()
+            yield from self.poll()
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
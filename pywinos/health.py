@@ -0,0 +1,104 @@
+import random
+import threading
+import time
+
+
+class HostUnavailableError(ConnectionError):
+    """Raised without connecting while the circuit of the host is open"""
+
+
+class CircuitBreaker:
+    """Per-host health tracking to fail fast on dead hosts.
+
+    After failure_threshold consecutive transport failures the circuit of
+    the host opens and calls fail immediately with HostUnavailableError.
+    When cooldown passes, one call is let through as a probe (half-open):
+    its success closes the circuit, its failure opens it for one more cooldown.
+
+    :param failure_threshold: Consecutive transport failures to open the circuit
+    :param cooldown: Seconds to fail fast before the probe
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host: str) -> dict:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = {'failures': 0, 'opened_at': None, 'probing': False}
+        return state
+
+    def state(self, host: str) -> str:
+        with self._lock:
+            state = self._host(host)
+            if state['opened_at'] is None:
+                return self.CLOSED
+            if state['probing'] or time.monotonic() - state['opened_at'] >= self.cooldown:
+                return self.HALF_OPEN
+            return self.OPEN
+
+    def before_call(self, host: str):
+        """Raise HostUnavailableError if the host must not be called now"""
+
+        with self._lock:
+            state = self._host(host)
+            if state['opened_at'] is None:
+                return
+
+            remaining = state['opened_at'] + self.cooldown - time.monotonic()
+            if remaining > 0 or state['probing']:
+                raise HostUnavailableError(
+                    f'{host} is unavailable after {state["failures"]} consecutive failures. '
+                    f'Next attempt in {max(remaining, 0):.1f} sec')
+            state['probing'] = True
+
+    def record_success(self, host: str):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def record_failure(self, host: str):
+        with self._lock:
+            state = self._host(host)
+            state['failures'] += 1
+            if state['probing'] or state['failures'] >= self.failure_threshold:
+                state['opened_at'] = time.monotonic()
+            state['probing'] = False
+
+    def end_probe(self, host: str):
+        """Let the next call probe again if the probe ended without success or failure recorded"""
+
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None:
+                state['probing'] = False
+
+    def reset(self, host: str = None):
+        """Forget failures of the host. Of all hosts if not specified"""
+
+        with self._lock:
+            if host is None:
+                self._hosts.clear()
+            else:
+                self._hosts.pop(host, None)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter
+
+    :param attempt: Retry number starting from 1
+    :param base: Delay of the first retry, sec
+    :param cap: Max delay, sec
+    """
+
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+# Shared across all client instances
+default_breaker = CircuitBreaker()
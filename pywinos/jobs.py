@@ -0,0 +1,394 @@
+import base64
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from subprocess import Popen, TimeoutExpired
+
+from pywinos.metrics import CommandMetrics
+from pywinos.runner import kill_group, new_group
+
+
+class RemoteJob:
+    """Handle of a command running on a remote host.
+
+    Nothing runs in background: output is fetched from the host by poll(),
+    read() and result() calls, so any number of jobs can be tracked by a
+    single thread.
+
+    :param client: WinOSClient
+    :param command: Command to execute
+    :param args: Arguments for command-line
+    :param ps: Specify if PowerShell is used
+    :param use_cred_ssp: Specify if CredSSP is used
+    :param poll_timeout: Max seconds a single poll() waits for new output. 1 at least
+    """
+
+    def __init__(self, client, command: str, args: tuple = (), ps: bool = False,
+                 use_cred_ssp: bool = False, poll_timeout: int = 1):
+        self.client = client
+        self.command = command
+        self.args = args
+        self.ps = ps
+        self.use_cred_ssp = use_cred_ssp
+        self.poll_timeout = max(1, int(poll_timeout))
+        self.metrics = CommandMetrics(client.host, command)
+        self.exit_code = None
+        self.cancelled = False
+        self.error = None
+        self._session = None
+        self._shell_id = None
+        self._command_id = None
+        self._stdout = []
+        self._stderr = []
+        self._read_stdout = 0
+        self._read_stderr = 0
+
+    def __repr__(self):
+        return f'<RemoteJob {self.client.host} [{self.state}] {self.command!r}>'
+
+    @property
+    def state(self) -> str:
+        if self.cancelled:
+            return 'cancelled'
+        if self.error is not None:
+            return 'failed'
+        if self.exit_code is not None:
+            return 'done'
+        return 'running' if self._command_id else 'new'
+
+    @property
+    def done(self) -> bool:
+        return self.exit_code is not None or self.cancelled or self.error is not None
+
+    def start(self):
+        """Send command to the host. Returns as soon as the command is accepted"""
+
+        command = self.command
+        if self.ps:
+            encoded_ps = base64.b64encode(command.encode('utf_16_le')).decode('ascii')
+            command = f'powershell -encodedcommand {encoded_ps}'
+
+        def start():
+            session = self.client._connect(self.use_cred_ssp)
+            protocol = session.protocol
+            self.metrics.count_traffic(protocol)
+
+            with self.metrics.phase('connect'):
+                protocol.transport.build_session()
+            with self.metrics.phase('open_shell'):
+                shell_id = protocol.open_shell()
+            with self.metrics.phase('execute'):
+                command_id = protocol.run_command(shell_id, command, self.args)
+            self._session, self._shell_id, self._command_id = session, shell_id, command_id
+
+        self.client.logger.info('[%s] Job started: %s', self.client.host, self.command)
+        try:
+            self.client._retry(start, self.metrics, hold_shell=True)
+        except Exception as err:
+            self.metrics.error = type(err).__name__
+            self.client._emit(self.metrics)
+            raise err
+        return self
+
+    def poll(self):
+        """Fetch new output. Waits poll_timeout sec at most if there is none.
+
+        If the host cannot be read, the command is stopped, its shell closed
+        and the error raised. The job is failed then and result() raises it.
+
+        :return: Exit code if the command finished, None otherwise
+        """
+
+        from winrm.exceptions import WinRMOperationTimeoutError
+
+        if self.done:
+            return self.exit_code
+
+        protocol = self._session.protocol
+        protocol.operation_timeout_sec = self.poll_timeout
+        protocol.transport.read_timeout_sec = self.poll_timeout + 10
+
+        scheduler = self.client.scheduler
+        if scheduler is not None:
+            with self.metrics.phase('queue'):
+                scheduler.acquire(self.client.host, shell=False)
+        try:
+            with self.metrics.phase('receive'):
+                stdout, stderr, exit_code, done = protocol._raw_get_command_output(
+                    self._shell_id, self._command_id)
+        except WinRMOperationTimeoutError:
+            return None
+        except BaseException as err:
+            self._abort(err)
+            raise
+        finally:
+            if scheduler is not None:
+                scheduler.release(self.client.host, shell=False)
+
+        self._stdout.append(stdout)
+        self._stderr.append(stderr)
+        if done:
+            self.exit_code = exit_code
+            self._close()
+        return self.exit_code
+
+    def _close(self):
+        protocol = self._session.protocol
+        try:
+            with self.metrics.phase('cleanup'):
+                protocol.cleanup_command(self._shell_id, self._command_id)
+                protocol.close_shell(self._shell_id)
+        finally:
+            self._release_shell()
+            self.client._emit(self.metrics)
+
+    def _abort(self, err: BaseException):
+        """Stop the command and free its shell after a failed poll"""
+
+        with self.metrics.phase('cleanup'):
+            self.client._cancel(self._session.protocol, self._shell_id, self._command_id)
+        self._release_shell()
+        self.error = err
+        self.metrics.error = type(err).__name__
+        self.client._emit(self.metrics)
+        self.client.logger.error('[%s] Job failed: %s. %s', self.client.host, self.command, err)
+
+    def _release_shell(self):
+        if self.client.scheduler is not None:
+            self.client.scheduler.release(self.client.host, operation=False)
+
+    @staticmethod
+    def _decode(chunks: list) -> str:
+        return b''.join(chunks).decode('cp1252')
+
+    def read(self) -> str:
+        """Stdout received since the previous read() call. Polls the host if job is running"""
+
+        if not self.done:
+            self.poll()
+        chunks, self._read_stdout = self._stdout[self._read_stdout:], len(self._stdout)
+        return self._decode(chunks)
+
+    def read_stderr(self) -> str:
+        """Stderr received since the previous read_stderr() call"""
+
+        chunks, self._read_stderr = self._stderr[self._read_stderr:], len(self._stderr)
+        return self._decode(chunks)
+
+    def result(self, timeout: float = None):
+        """Wait for the command to finish.
+
+        :param timeout: Raise TimeoutExpired after this number of seconds. The job keeps running
+        :return: ResponseParser. Exit code is -1 if the job was cancelled. Error of a failed job is raised
+        """
+
+        import winrm
+        from pywinos.pywinos import ResponseParser
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while not self.done:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutExpired(self.command, timeout, b''.join(self._stdout), b''.join(self._stderr))
+            self.poll()
+
+        if self.error is not None:
+            raise self.error
+        exit_code = -1 if self.exit_code is None else self.exit_code
+        response = winrm.Response((b''.join(self._stdout), b''.join(self._stderr), exit_code))
+        if self.ps and response.std_err:
+            response.std_err = self._session._clean_error_msg(response.std_err)
+        return ResponseParser(response, self.metrics, self.client.logger)
+
+    def cancel(self):
+        """Interrupt the command and close its shell"""
+
+        if self.done or not self._command_id:
+            return
+
+        with self.metrics.phase('cleanup'):
+            self.client._cancel(self._session.protocol, self._shell_id, self._command_id)
+        self._release_shell()
+        self.cancelled = True
+        self.metrics.error = 'Cancelled'
+        self.client._emit(self.metrics)
+        self.client.logger.info('[%s] Job cancelled: %s', self.client.host, self.command)
+
+
+class LocalJob:
+    """Handle of a command running locally. Same interface as RemoteJob.
+
+    Output is written to temporary files and read incrementally, no threads involved.
+    """
+
+    def __init__(self, client, command: str, label: str = 'CMD'):
+        self.client = client
+        self.command = command
+        self.label = label
+        self.metrics = CommandMetrics('localhost', command)
+        self.exit_code = None
+        self.cancelled = False
+        self._process = None
+        self._started = None
+        self._paths = ()
+        self._readers = ()
+        self._stdout = []
+        self._stderr = []
+        self._read_stdout = 0
+        self._read_stderr = 0
+
+    def __repr__(self):
+        return f'<LocalJob [{self.state}] {self.command!r}>'
+
+    @property
+    def state(self) -> str:
+        if self.cancelled:
+            return 'cancelled'
+        if self.exit_code is not None:
+            return 'done'
+        return 'running' if self._process else 'new'
+
+    @property
+    def done(self) -> bool:
+        return self.exit_code is not None or self.cancelled
+
+    def start(self):
+        paths = []
+        for _ in range(2):
+            fd, path = tempfile.mkstemp(prefix='pywinos-job-')
+            os.close(fd)
+            paths.append(path)
+        self._paths = tuple(paths)
+
+        self.client.logger.info('[LOCAL %s] Job started: %s', self.label, self.command)
+        # Own process group, so cancel() stops the children of the shell too
+        with open(paths[0], 'wb') as stdout, open(paths[1], 'wb') as stderr:
+            with self.metrics.phase('spawn'):
+                self._process = Popen(self.command, shell=True, stdout=stdout, stderr=stderr, **new_group())
+        self._started = time.perf_counter()
+        self._readers = tuple(open(path, 'rb') for path in paths)
+        return self
+
+    def _collect(self):
+        self._stdout.append(self._readers[0].read())
+        self._stderr.append(self._readers[1].read())
+
+    def _close(self):
+        with self._process:
+            pass  # Closes process pipes and reaps it
+        for reader in self._readers:
+            reader.close()
+        for path in self._paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.metrics.bytes_received = sum(map(len, self._stdout)) + sum(map(len, self._stderr))
+        self.client._emit(self.metrics)
+
+    def poll(self):
+        if self.done:
+            return self.exit_code
+
+        exit_code = self._process.poll()
+        self._collect()
+        if exit_code is not None:
+            self._collect()
+            self.metrics.timings['execute'] = time.perf_counter() - self._started
+            self.exit_code = exit_code
+            self._close()
+        return self.exit_code
+
+    def read(self) -> str:
+        if not self.done:
+            self.poll()
+        chunks, self._read_stdout = self._stdout[self._read_stdout:], len(self._stdout)
+        return b''.join(chunks).decode('cp1252')
+
+    def read_stderr(self) -> str:
+        chunks, self._read_stderr = self._stderr[self._read_stderr:], len(self._stderr)
+        return b''.join(chunks).decode('cp1252')
+
+    def result(self, timeout: float = None):
+        from pywinos.pywinos import ResponseParser
+
+        if not self.done:
+            try:
+                self._process.wait(timeout)
+            except TimeoutExpired:
+                self._collect()
+                raise TimeoutExpired(self.command, timeout, b''.join(self._stdout), b''.join(self._stderr))
+            self.poll()
+
+        exit_code = -1 if self.exit_code is None else self.exit_code
+        response = exit_code, b''.join(self._stdout), b''.join(self._stderr)
+        return ResponseParser(response, self.metrics, self.client.logger)
+
+    def cancel(self):
+        if self.done or not self._process:
+            return
+
+        kill_group(self._process)
+        self._process.wait()
+        self._collect()
+        self.cancelled = True
+        self.metrics.error = 'Cancelled'
+        self._close()
+
+
+def wait_jobs(jobs: list, timeout: float = None, workers: int = 16) -> list:
+    """Poll jobs until all of them finish.
+
+    Remote jobs are polled concurrently by a pool of workers, so a finished
+    job is noticed within one poll no matter how many jobs are running.
+    A failed job is returned as finished: its result() raises the error.
+
+    :param jobs: RemoteJob or LocalJob list
+    :param timeout: Stop waiting after this number of seconds. Polls in progress are let finish
+    :param workers: Max remote jobs polled at the same time
+    :return: Finished jobs in completion order
+    """
+
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    finished = [job for job in jobs if job.done]
+    remote = deque(job for job in jobs if not job.done and isinstance(job, RemoteJob))
+    local = [job for job in jobs if not job.done and not isinstance(job, RemoteJob)]
+    polling = {}
+
+    def collect(futures):
+        for future in futures:
+            job = polling.pop(future)
+            if job.done:  # Errors of failed polls are kept by the job
+                finished.append(job)
+            else:
+                remote.append(job)
+
+    with ThreadPoolExecutor(max(1, min(workers, len(remote)))) as executor:
+        while remote or polling or local:
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                break
+
+            while remote and len(polling) < workers:
+                job = remote.popleft()
+                polling[executor.submit(job.poll)] = job
+
+            for job in list(local):
+                job.poll()
+                if job.done:
+                    local.remove(job)
+                    finished.append(job)
+
+            wait_for = remaining
+            if local:
+                wait_for = 0.05 if remaining is None else min(0.05, remaining)
+            if polling:
+                done, _ = wait(polling, wait_for, return_when=FIRST_COMPLETED)
+                collect(done)
+            elif local:
+                time.sleep(wait_for)
+
+        done, _ = wait(polling)
+        collect(done)
+    return finished
@@ -0,0 +1,105 @@
+import atexit
+import logging
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+logger_name = 'WinOSClient'
+logger = logging.getLogger(logger_name)
+logger.setLevel(logging.INFO)
+formatter = logging.Formatter(fmt='%(asctime)-15s | %(levelname)s | %(name)s | %(message)s',
+                              datefmt='%Y-%m-%d %H:%M:%S')
+
+
+class _QueueHandler(QueueHandler):
+    """Put records to a queue, so emitting never blocks command execution.
+
+    Records are formatted and written by the listener thread that is started
+    on the first record.
+    """
+
+    def __init__(self, *handlers):
+        super().__init__(queue.Queue())
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _start(self):
+        with self._lock:
+            if not self._started:
+                self.listener.start()
+                atexit.register(self.listener.stop)
+                self._started = True
+
+    def prepare(self, record):
+        # Records never leave the process. Keep them as is to format lazily
+        return record
+
+    def emit(self, record):
+        if not self._started:
+            self._start()
+        super().emit(record)
+
+
+# Console logger
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+ch.setFormatter(formatter)
+logger.addHandler(_QueueHandler(ch))
+
+
+class _Payload:
+    """Command output truncated on formatting only"""
+
+    __slots__ = ('text', 'limit')
+
+    def __init__(self, text, limit: int):
+        self.text = text
+        self.limit = limit
+
+    def __str__(self):
+        text = str(self.text)
+        if self.limit and len(text) > self.limit:
+            return f'{text[:self.limit]}... [{len(text) - self.limit} more chars truncated]'
+        return text
+
+
+class ClientLogger(logging.LoggerAdapter):
+    """Per-client logger.
+
+    :param host: Host to prefix messages with
+    :param enabled: Log nothing if False. Does not affect other clients
+    :param payload_limit: Truncate logged stdout/stderr to this number of chars. 0 to log all
+    :param sample_rate: Fraction of stdout payloads to log, from 0.0 to 1.0
+    """
+
+    def __init__(self,
+                 host: str = '',
+                 enabled: bool = True,
+                 payload_limit: int = 4096,
+                 sample_rate: float = 1.0):
+        super().__init__(logger, {'host': host})
+        self.enabled = enabled
+        self.payload_limit = payload_limit
+        self.sample_rate = sample_rate
+
+    def isEnabledFor(self, level):
+        return self.enabled and self.logger.isEnabledFor(level)
+
+    def payload(self, level: int, text: str, sampled: bool = True):
+        """Log command output.
+
+        :param level: Logging level
+        :param text: Command output
+        :param sampled: Skip the record according to sample_rate
+        """
+
+        if not self.isEnabledFor(level):
+            return
+        if sampled and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.log(level, '%s', _Payload(text, self.payload_limit))
+
+
+default_logger = ClientLogger()
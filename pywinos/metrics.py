@@ -0,0 +1,126 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+class CommandMetrics:
+    """Timings and traffic of a single command.
+
+    Remote phases: connect, open_shell, execute, receive, cleanup.
+    Local phases: spawn, execute.
+    All timings are in seconds. Traffic is counted as SOAP payload size.
+    """
+
+    __slots__ = ('host', 'command', 'timings', 'bytes_sent', 'bytes_received', 'retries', 'error')
+
+    def __init__(self, host: str = '', command: str = ''):
+        self.host = host
+        self.command = command
+        self.timings = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.error = None
+
+    def __repr__(self):
+        timings = ', '.join(f'{name}={value:.4f}' for name, value in self.timings.items())
+        return (f'CommandMetrics(host={self.host!r}, total={self.total:.4f}, {timings}, '
+                f'sent={self.bytes_sent}, received={self.bytes_received}, retries={self.retries})')
+
+    @property
+    def total(self) -> float:
+        return sum(self.timings.values())
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Add time spent inside the block to the phase specified"""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def count_traffic(self, protocol):
+        """Count bytes passing through pywinrm Protocol.send_message"""
+
+        send_message = protocol.send_message
+
+        def counted(message):
+            self.bytes_sent += len(message)
+            response = send_message(message)
+            self.bytes_received += len(response)
+            return response
+
+        protocol.send_message = counted
+
+    def as_dict(self) -> dict:
+        return {
+            'host': self.host,
+            'command': self.command,
+            'timings': dict(self.timings),
+            'total': self.total,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'retries': self.retries,
+            'error': self.error,
+        }
+
+
+class MetricsCollector:
+    """Thread-safe counters and latency histograms.
+
+    Pass an instance as WinOSClient(metrics_hook=...) and export
+    snapshot() to your metrics stack periodically.
+
+    :param buckets: Histogram upper bounds in seconds
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __call__(self, metrics: CommandMetrics):
+        with self._lock:
+            self.counters['commands'] += 1
+            self.counters['errors'] += not metrics.ok
+            self.counters['bytes_sent'] += metrics.bytes_sent
+            self.counters['bytes_received'] += metrics.bytes_received
+            self.counters['retries'] += metrics.retries
+
+            for name, value in metrics.timings.items():
+                self._observe(name, value)
+            self._observe('total', metrics.total)
+
+    def _observe(self, name: str, value: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+        histogram['counts'][bisect_left(self.buckets, value)] += 1
+        histogram['sum'] += value
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(('commands', 'errors', 'bytes_sent', 'bytes_received', 'retries'), 0)
+            self.histograms = {}
+
+    def snapshot(self) -> dict:
+        """Copy of counters and histograms. The last bucket of counts is +Inf"""
+
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'buckets': list(self.buckets),
+                'histograms': {
+                    name: {'counts': list(value['counts']), 'sum': value['sum']}
+                    for name, value in self.histograms.items()
+                },
+            }
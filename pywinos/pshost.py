@@ -0,0 +1,216 @@
+import base64
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from subprocess import Popen, PIPE, STDOUT, TimeoutExpired
+
+FRAME_MARKER = '##PYWINOS-FRAME##'
+
+# Reads base64 encoded scripts from stdin line by line and answers every
+# one of them with a single frame line: marker + base64 JSON {o, e, c}.
+# Anything else printed by the host (Write-Host) is returned as stdout.
+BOOTSTRAP = r'''
+$ErrorActionPreference = 'Continue'
+$ProgressPreference = 'SilentlyContinue'
+[Console]::OutputEncoding = [Text.Encoding]::UTF8
+$__pywinos_location = Get-Location
+while ($true) {
+    $__pywinos_line = [Console]::In.ReadLine()
+    if ($null -eq $__pywinos_line) { break }
+    Set-Location $__pywinos_location
+    $__pywinos_script = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String($__pywinos_line))
+    $global:LASTEXITCODE = 0
+    $__pywinos_failed = $false
+    $__pywinos_records = @()
+    try {
+        $__pywinos_records = @(& ([ScriptBlock]::Create($__pywinos_script)) 2>&1)
+        if (-not $?) { $__pywinos_failed = $true }
+    } catch {
+        $__pywinos_records += $_
+        $__pywinos_failed = $true
+    }
+    $__pywinos_errors = @($__pywinos_records | Where-Object { $_ -is [Management.Automation.ErrorRecord] })
+    $__pywinos_output = @($__pywinos_records | Where-Object { $_ -isnot [Management.Automation.ErrorRecord] })
+    $__pywinos_code = if ($LASTEXITCODE) { $LASTEXITCODE }
+                      elseif ($__pywinos_failed -or $__pywinos_errors.Count) { 1 }
+                      else { 0 }
+    $__pywinos_frame = @{
+        o = ($__pywinos_output | Out-String).TrimEnd()
+        e = ($__pywinos_errors | Out-String).TrimEnd()
+        c = $__pywinos_code
+    } | ConvertTo-Json -Compress
+    [Console]::Out.WriteLine('##PYWINOS-FRAME##' + [Convert]::ToBase64String([Text.Encoding]::UTF8.GetBytes($__pywinos_frame)))
+    [Console]::Out.Flush()
+}
+'''
+
+
+def find_powershell() -> str:
+    """powershell.exe on Windows, pwsh elsewhere"""
+
+    names = ('powershell.exe', 'pwsh') if os.name == 'nt' else ('pwsh', 'powershell')
+    for name in names:
+        path = shutil.which(name)
+        if path:
+            return path
+    raise FileNotFoundError('PowerShell not found. Install "pwsh" or add it to PATH.')
+
+
+def host_command(executable: str = None) -> list:
+    encoded = base64.b64encode(BOOTSTRAP.encode('utf_16_le')).decode('ascii')
+    return [executable or find_powershell(), '-NoLogo', '-NoProfile', '-NonInteractive', '-EncodedCommand', encoded]
+
+
+class PowerShellHost:
+    """Long-lived PowerShell process executing scripts sent over stdin.
+
+    Every script runs in its own scope starting from the initial location.
+
+    :param command: Process command line. PowerShell with the bootstrap script by default
+    """
+
+    def __init__(self, command: list = None):
+        self.command = command or host_command()
+        self.commands_run = 0
+        self._process = None
+        self._lines = queue.Queue()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        self._process = Popen(self.command, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self._process.stdout, self._lines), daemon=True).start()
+        return self
+
+    @staticmethod
+    def _read(stream, lines: queue.Queue):
+        for line in iter(stream.readline, b''):
+            lines.put(line)
+        lines.put(None)  # EOF. The process is gone
+
+    def stop(self):
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+            self._process.wait(5)
+        except (OSError, TimeoutExpired):
+            self._process.kill()
+            self._process.wait()
+        self._process.stdout.close()
+        self._process = None
+
+    def kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process.stdout.close()
+            self._process = None
+
+    def run(self, script: str, timeout: float = None) -> tuple:
+        """Execute script.
+
+        If the script exits the host (e.g. "exit 3"), the process exit code is
+        returned and the host must be restarted.
+
+        :param script: PowerShell script
+        :param timeout: Kill the host and raise TimeoutExpired after this number of seconds
+        :return: (exit code, stdout, stderr) as bytes
+        """
+
+        if not self.alive:
+            self.start()
+
+        self.commands_run += 1
+        request = base64.b64encode(script.encode('utf-8')) + b'\n'
+        try:
+            self._process.stdin.write(request)
+            self._process.stdin.flush()
+        except OSError:
+            pass  # Crashed. The reader reports EOF below
+
+        deadline = time.monotonic() + timeout if timeout else None
+        stray = []
+        while True:
+            try:
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                line = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                self.kill()
+                raise TimeoutExpired(script, timeout, b''.join(stray))
+
+            if line is None:  # The script exited the host
+                exit_code = self._process.wait()
+                self.kill()
+                return exit_code, b''.join(stray).rstrip(), b''
+
+            text = line.decode('utf-8', errors='replace').strip()
+            if text.startswith(FRAME_MARKER):
+                frame = json.loads(base64.b64decode(text[len(FRAME_MARKER):]).decode('utf-8'))
+                stdout = b''.join(stray) + (frame['o'] or '').encode('utf-8')
+                return int(frame['c']), stdout, (frame['e'] or '').encode('utf-8')
+            stray.append(line)
+
+
+class PowerShellPool:
+    """Pool of PowerShellHost processes.
+
+    Hosts are started on demand, restarted after a crash or timeout, and
+    recycled after max_commands scripts to keep memory use bounded.
+
+    :param size: Max number of host processes
+    :param max_commands: Restart a host after this number of scripts
+    :param command: Host process command line. PowerShell with the bootstrap script by default
+    """
+
+    def __init__(self, size: int = 2, max_commands: int = 1000, command: list = None):
+        self.size = size
+        self.max_commands = max_commands
+        self.command = command
+        self.restarts = 0
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)  # Not started yet
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def run(self, script: str, timeout: float = None) -> tuple:
+        """Execute script on an idle host. Blocks while all hosts are busy
+
+        :return: (exit code, stdout, stderr) as bytes
+        """
+
+        host = self._idle.get()
+        try:
+            if host is None:
+                host = PowerShellHost(self.command)
+            elif not host.alive or host.commands_run >= self.max_commands:
+                host.stop()
+                host = PowerShellHost(self.command)
+                self.restarts += 1
+            return host.run(script, timeout)
+        finally:
+            self._idle.put(host)
+
+    def close(self):
+        """Stop all idle hosts"""
+
+        hosts = []
+        while not self._idle.empty():
+            hosts.append(self._idle.get())
+        for host in hosts:
+            if host is not None:
+                host.stop()
+            self._idle.put(None)
@@ -0,0 +1,305 @@
+import threading
+import time
+import uuid
+import warnings
+from collections import deque
+from contextlib import contextmanager
+from subprocess import TimeoutExpired
+
+from pywinos.logs import ClientLogger, default_logger, logger
+from pywinos.metrics import CommandMetrics
+
+# Runs init script, then holds the runspace until all warming pipelines
+# got theirs, so every runspace of the pool runs the script exactly once.
+# Runspaces of a pool live in one process and share the barrier object.
+_WARM_SCRIPT = '''try {{
+{init}
+}} finally {{
+    $__barrier = [AppDomain]::CurrentDomain.GetData('{key}')
+    [void]$__barrier.Signal()
+    if (-not $__barrier.Wait([TimeSpan]::FromSeconds({timeout}))) {{ Write-Error 'Not every runspace was warmed' }}
+}}'''
+_BARRIER_SCRIPT = "[AppDomain]::CurrentDomain.SetData('{key}', {value})"
+
+
+class _FairLock:
+    """Lock granted in request order, so a caller polling in a loop does not starve others"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._waiters = deque()
+        self._busy = False
+
+    def __enter__(self):
+        waiter = object()
+        with self._cond:
+            self._waiters.append(waiter)
+            try:
+                while self._busy or self._waiters[0] is not waiter:
+                    self._cond.wait()
+            except BaseException:
+                self._waiters.remove(waiter)
+                self._cond.notify_all()
+                raise
+            self._waiters.popleft()
+            self._busy = True
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._cond:
+            self._busy = False
+            self._cond.notify_all()
+
+
+class PSRPPool:
+    """PowerShell Remoting Protocol runspace pool on a single connection.
+
+    Several pipelines run on the host at the same time, one per runspace.
+    Runspaces stay open between calls, optionally warmed with init_script
+    (e.g. Import-Module), so small calls do not pay shell and PowerShell
+    startup every time.
+
+    Every caller receives output of its own pipelines. pypsrp is not
+    thread-safe, so requests of all callers go one at a time, which also
+    keeps the sequence numbers of an encrypting security context in order.
+    The connection is released between polls, so callers take turns.
+
+    pip install pypsrp
+
+    :param host: Remote host
+    :param username: Username
+    :param password: Password
+    :param size: Number of runspaces, i.e. max concurrent pipelines
+    :param init_script: Script to run in every runspace once it is open
+    :param ssl: Use HTTPS
+    :param port: WinRM port. 5985 for HTTP and 5986 for HTTPS by default
+    :param auth: Authentication: negotiate, ntlm, kerberos, basic, certificate, credssp
+    :param encryption: Message encryption: auto, always, never
+    :param cert_validation: Validate server certificate
+    :param metrics_hook: Callable to pass CommandMetrics of every call to
+    :param log: Client logger
+    """
+
+    def __init__(self,
+                 host: str,
+                 username: str = '',
+                 password: str = '',
+                 size: int = 4,
+                 init_script: str = None,
+                 ssl: bool = False,
+                 port: int = None,
+                 auth: str = 'ntlm',
+                 encryption: str = 'auto',
+                 cert_validation: bool = False,
+                 metrics_hook=None,
+                 log: ClientLogger = default_logger,
+                 **wsman_kwargs):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.size = size
+        self.init_script = init_script
+        self.ssl = ssl
+        self.port = port
+        self.auth = auth
+        self.encryption = encryption
+        self.cert_validation = cert_validation
+        self.metrics_hook = metrics_hook
+        self.log = log
+        self.wsman_kwargs = wsman_kwargs
+        self._pool = None
+        self._lock = threading.RLock()
+        self._wire = _FairLock()
+
+    @contextmanager
+    def _request(self):
+        """Exclusive use of the pool and its connection for one request"""
+
+        with self._wire:
+            yield
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def opened(self) -> bool:
+        return self._pool is not None
+
+    def open(self):
+        """Connect and open runspaces. Called on first use automatically"""
+
+        try:
+            from pypsrp.powershell import RunspacePool
+            from pypsrp.wsman import WSMan
+        except ModuleNotFoundError as err:
+            warnings.warn('To use PSRP execution mode use "pip install pypsrp".')
+            logger.warning('To use PSRP execution mode perform "pip install pypsrp"')
+            raise err
+
+        with self._lock:
+            if self._pool is not None:
+                return self
+
+            wsman = WSMan(
+                self.host,
+                port=self.port,
+                username=self.username,
+                password=self.password,
+                ssl=self.ssl,
+                auth=self.auth,
+                encryption=self.encryption,
+                cert_validation=self.cert_validation,
+                **self.wsman_kwargs)
+            pool = RunspacePool(wsman, min_runspaces=self.size, max_runspaces=self.size)
+            pool.open()
+            self._wait_runspaces(pool)
+            self._pool = pool
+
+        if self.init_script:
+            self._warm()
+        return self
+
+    def _wait_runspaces(self, pool, timeout: float = 30):
+        """Wait until the pool reports all its runspaces available"""
+
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._request():
+                available = pool.get_available_runspaces()
+            if available >= self.size:
+                return
+            if time.monotonic() >= deadline:
+                self.log.warning('[%s] %s of %s runspaces available', self.host, available, self.size)
+                return
+            time.sleep(0.1)
+
+    def _warm(self, timeout: float = 60):
+        """Run init script once in every runspace"""
+
+        key = f'pywinos-warm-{uuid.uuid4()}'
+        self.run(_BARRIER_SCRIPT.format(key=key, value=f'(New-Object Threading.CountdownEvent {self.size})'))
+        try:
+            script = _WARM_SCRIPT.format(init=self.init_script, key=key, timeout=int(timeout))
+            warm = self.run_many([script] * self.size, timeout + 30)
+        finally:
+            self.run(_BARRIER_SCRIPT.format(key=key, value='$null'))
+        failed = [response.stderr for response in warm if not response.ok]
+        if failed:
+            self.log.error('[%s] Runspace init script failed: %s', self.host, failed[0])
+
+    def close(self):
+        with self._lock, self._request():
+            if self._pool is not None:
+                try:
+                    self._pool.close()
+                finally:
+                    self._pool = None
+
+    def _begin(self, script: str):
+        from pypsrp.powershell import PowerShell
+
+        if self._pool is None:
+            self.open()
+
+        with self._lock, self._request():
+            ps = PowerShell(self._pool)
+            ps.add_script(script)
+            ps.begin_invoke()
+        return ps
+
+    def _wait(self, ps, script: str, deadline: float = None, timeout: float = None):
+        """Poll pipeline until it finishes, releasing the connection between polls"""
+
+        from pypsrp.complex_objects import PSInvocationState
+
+        while ps.state == PSInvocationState.RUNNING:
+            if deadline is not None and time.monotonic() >= deadline:
+                with self._request():
+                    ps.stop()
+                raise TimeoutExpired(script, timeout, self._text(ps.output))
+            with self._request():
+                ps.poll_invoke(timeout=1)
+
+    def _stop(self, ps):
+        """Stop pipeline if it is still running. Best effort"""
+
+        from pypsrp.complex_objects import PSInvocationState
+
+        if ps.state != PSInvocationState.RUNNING:
+            return
+        try:
+            with self._request():
+                ps.stop()
+        except Exception as err:
+            self.log.warning('[%s] Cannot stop pipeline: %s', self.host, err)
+
+    @staticmethod
+    def _text(items: list) -> bytes:
+        return '\n'.join(str(item) for item in items).encode('utf-8')
+
+    def _response(self, ps, metrics: CommandMetrics):
+        from pywinos.pywinos import ResponseParser
+
+        response = 1 if ps.had_errors else 0, self._text(ps.output), self._text(ps.streams.error)
+        metrics.bytes_received = len(response[1]) + len(response[2])
+        return ResponseParser(response, metrics, self.log, encoding='utf-8')
+
+    def _emit(self, metrics: CommandMetrics):
+        if self.metrics_hook is not None:
+            try:
+                self.metrics_hook(metrics)
+            except Exception as err:
+                self.log.warning('Metrics hook error: %s', err)
+
+    def run(self, script: str, timeout: float = None, metrics: CommandMetrics = None):
+        """Run script on a free runspace.
+
+        Safe to call from several threads: their pipelines run concurrently.
+
+        :param script: PowerShell script
+        :param timeout: Stop pipeline and raise TimeoutExpired after this number of seconds
+        :param metrics: CommandMetrics to record the call to
+        :return: ResponseParser
+        """
+
+        return self.run_many([script], timeout, None if metrics is None else [metrics])[0]
+
+    def run_many(self, scripts: list, timeout: float = None, metrics: list = None) -> list:
+        """Run scripts concurrently, one pipeline per script.
+
+        Pipelines above the pool size wait on the host for a free runspace.
+
+        :param scripts: PowerShell scripts
+        :param timeout: Stop pipelines and raise TimeoutExpired after this number of seconds
+        :param metrics: CommandMetrics per script to record calls to
+        :return: ResponseParser list in the order of scripts
+        """
+
+        if self._pool is None:
+            self.open()
+
+        deadline = time.monotonic() + timeout if timeout else None
+        metrics = metrics or [CommandMetrics(self.host, script) for script in scripts]
+        started = []
+        try:
+            for script, item_metrics in zip(scripts, metrics):
+                with item_metrics.phase('execute'):
+                    started.append((script, item_metrics, self._begin(script)))
+
+            responses = []
+            for script, item_metrics, ps in started:
+                with item_metrics.phase('receive'):
+                    self._wait(ps, script, deadline, timeout)
+                responses.append(self._response(ps, item_metrics))
+            return responses
+
+        except Exception as err:
+            for _, item_metrics, ps in started:
+                item_metrics.error = type(err).__name__
+                self._stop(ps)
+            raise err
+        finally:
+            for _, item_metrics, _ in started:
+                self._emit(item_metrics)
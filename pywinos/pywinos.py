@@ -1,6 +1,4 @@
 import base64
-import fileinput
-import hashlib
 import json
 import logging
 import os
@@ -8,50 +6,54 @@ import platform
 import shutil
 import socket
 import sys
+import time
 import warnings
-import zipfile
 from collections import namedtuple
 from datetime import datetime
 from subprocess import Popen, PIPE, TimeoutExpired
 
-import winrm
-from requests.exceptions import ConnectionError
-from winrm import Protocol
-from winrm.exceptions import (InvalidCredentialsError,
-                              WinRMError,
-                              WinRMTransportError,
-                              WinRMOperationTimeoutError)
+from pywinos.cache import ResultCache
+from pywinos.compression import compressed_command, decompress, is_compressed
+from pywinos.events import EventQuery
+from pywinos.facts import CATEGORIES, HostFacts, facts_script
+from pywinos.filecopy import copy_large
+from pywinos.follow import LogFollower
+from pywinos.health import HostUnavailableError, backoff_delay, default_breaker
+from pywinos.jobs import LocalJob, RemoteJob
+from pywinos.logs import ClientLogger, default_logger, logger
+from pywinos.metrics import CommandMetrics
+from pywinos.pshost import PowerShellPool
+from pywinos.psrp import PSRPPool
+from pywinos.runner import run_many
+from pywinos.scheduler import is_quota_error
+from pywinos.scripts import ScriptRegistry, local_script, ps_arguments
 
 __author__ = 'Andrey Komissarov'
 __email__ = 'a.komisssarov@gmail.com'
 __date__ = '12.2019'
 __version__ = '1.0.7'
 
-logger_name = 'WinOSClient'
-logger = logging.getLogger(logger_name)
-logger.setLevel(logging.INFO)
-formatter = logging.Formatter(fmt='%(asctime)-15s | %(levelname)s | %(name)s | %(message)s',
-                              datefmt='%Y-%m-%d %H:%M:%S')
-
-# Console logger
-ch = logging.StreamHandler()
-ch.setLevel(logging.INFO)
-ch.setFormatter(formatter)
-logger.addHandler(ch)
-
 
 class ResponseParser:
     """Response parser"""
 
-    def __init__(self, response):
+    def __init__(self,
+                 response,
+                 metrics: CommandMetrics = None,
+                 log: ClientLogger = default_logger,
+                 encoding: str = 'cp1252'):
         self.response = response
+        self.metrics = metrics
+        self.log = log
+        self.encoding = encoding
 
     def __repr__(self):
         return str(self.response)
 
-    @staticmethod
-    def _decoder(response):
-        return response.decode('cp1252').strip()
+    def _decoder(self, response):
+        if is_compressed(response):
+            return decompress(response).decode('utf-8').strip()
+        return response.decode(self.encoding).strip()
 
     @property
     def stdout(self) -> str:
@@ -60,7 +62,7 @@ class ResponseParser:
         except AttributeError:
             stdout = self._decoder(self.response[1])
         out = stdout if stdout else None
-        logger.info(out)
+        self.log.payload(logging.INFO, out)
         return out
 
     @property
@@ -71,7 +73,7 @@ class ResponseParser:
             stderr = self._decoder(self.response[2])
         err = stderr if stderr else None
         if err:
-            logger.error(err)
+            self.log.payload(logging.ERROR, err, sampled=False)
         return err
 
     @property
@@ -80,7 +82,7 @@ class ResponseParser:
             exited = self.response.status_code
         except AttributeError:
             exited = self.response[0]
-        logger.info(exited)
+        self.log.info('%s', exited)
         return exited
 
     @property
@@ -90,6 +92,12 @@ class ResponseParser:
         except AttributeError:
             return self.response[0] == 0
 
+    @property
+    def timings(self) -> dict:
+        """Seconds spent in every phase of the command"""
+
+        return self.metrics.timings if self.metrics else {}
+
     def json(self):
         return json.loads(self.stdout)
 
@@ -111,18 +119,62 @@ class WinOSClient:
     """
 
     _URL = 'https://pypi.org/project/pywinrm/'
+    _SIGNAL_URI = 'http://schemas.microsoft.com/wbem/wsman/1/windows/shell/signal/'
+    _MAX_OPERATION_TIMEOUT = 20
+    # pywinrm transport to pypsrp auth
+    _PSRP_AUTH = {'plaintext': 'basic', 'ssl': 'basic'}
 
     def __init__(
             self,
             host: str = '',
             username: str = '',
             password: str = '',
-            logger_enabled: bool = True):
+            logger_enabled: bool = True,
+            metrics_hook=None,
+            log_payload_limit: int = 4096,
+            log_sample_rate: float = 1.0,
+            cache=None,
+            circuit_breaker=default_breaker,
+            retries: int = 0,
+            backoff: float = 0.5,
+            ps_pool=None,
+            use_psrp: bool = False,
+            psrp_pool_size: int = 4,
+            psrp_init_script: str = None,
+            compress_output: bool = False,
+            scheduler=None,
+            transport: str = 'ntlm',
+            ssl: bool = False,
+            port: int = None,
+            message_encryption: str = 'auto',
+            cert_validation: bool = False,
+            cert_pem: str = None,
+            cert_key_pem: str = None):
 
         self.host = host
         self.username = username
         self.password = password
-        logger.disabled = not logger_enabled
+        self.transport = transport
+        self.ssl = ssl
+        self.port = port
+        self.message_encryption = message_encryption
+        self.cert_validation = cert_validation
+        self.cert_pem = cert_pem
+        self.cert_key_pem = cert_key_pem
+        self.metrics_hook = metrics_hook
+        self.logger = ClientLogger(host, logger_enabled, log_payload_limit, log_sample_rate)
+        self.cache = ResultCache() if cache is True else cache or None
+        self.circuit_breaker = circuit_breaker
+        self.retries = retries
+        self.backoff = backoff
+        self.ps_pool = PowerShellPool() if ps_pool is True else ps_pool or None
+        self.use_psrp = use_psrp
+        self.psrp_pool_size = psrp_pool_size
+        self.psrp_init_script = psrp_init_script
+        self._psrp = None
+        self.compress_output = compress_output
+        self.scheduler = scheduler
+        self.scripts = ScriptRegistry(self)
 
     def __str__(self):
         return (
@@ -150,20 +202,22 @@ class WinOSClient:
         return not self.host or self.host == 'localhost' \
                or self.host == '127.0.0.1'
 
-    def is_host_available(self, port: int = 5985, timeout: int = 5) -> bool:
+    def is_host_available(self, port: int = None, timeout: int = 5) -> bool:
         """Check remote host is available using specified port.
 
-        Port 5985 used by default
+        WinRM port of the client used by default
         """
 
         if self.__local():
             return True
 
+        port = port or self.port or (5986 if self.ssl else 5985)
+
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             sock.settimeout(timeout)
             response = sock.connect_ex((self.host, port))
             result = False if response else True
-            logger.info(f'{self.host} is available: {result}')
+            self.logger.info('%s is available: %s', self.host, result)
             return result
 
     # ---------- Remote section ----------
@@ -171,12 +225,49 @@ class WinOSClient:
     def session(self):
         """Create WinRM session connection to a remote server"""
 
-        session = winrm.Session(self.host, auth=(self.username, self.password))
+        import winrm
+
+        session = winrm.Session(
+            self._endpoint(self.ssl),
+            auth=(self.username, self.password),
+            transport=self.transport,
+            server_cert_validation='validate' if self.cert_validation else 'ignore',
+            cert_pem=self.cert_pem,
+            cert_key_pem=self.cert_key_pem,
+            message_encryption=self.message_encryption)
         return session
 
+    @property
+    def psrp(self) -> PSRPPool:
+        """PSRP runspace pool to the remote server. Opened on first use"""
+
+        if self._psrp is None:
+            self._psrp = PSRPPool(
+                self.host, self.username, self.password,
+                size=self.psrp_pool_size,
+                init_script=self.psrp_init_script,
+                ssl=self.ssl,
+                port=self.port,
+                auth=self._PSRP_AUTH.get(self.transport, self.transport),
+                encryption=self.message_encryption,
+                cert_validation=self.cert_validation,
+                metrics_hook=self._emit,
+                log=self.logger,
+                certificate_pem=self.cert_pem,
+                certificate_key_pem=self.cert_key_pem)
+        return self._psrp
+
+    def close(self):
+        """Close PSRP runspace pool if it was opened"""
+
+        if self._psrp is not None:
+            self._psrp.close()
+
     def _protocol(self, endpoint: str, transport: str):
         """Create Protocol using low-level API"""
 
+        from winrm import Protocol
+
         session = self.session
 
         protocol = Protocol(
@@ -184,19 +275,237 @@ class WinOSClient:
             transport=transport,
             username=self.username,
             password=self.password,
-            server_cert_validation='ignore',
-            message_encryption='always')
+            server_cert_validation='validate' if self.cert_validation else 'ignore',
+            cert_pem=self.cert_pem,
+            cert_key_pem=self.cert_key_pem,
+            message_encryption=self.message_encryption)
 
         session.protocol = protocol
         return session
 
+    def _endpoint(self, ssl: bool) -> str:
+        """WSMan URL. Client port is used for the client scheme, default WinRM port otherwise"""
+
+        port = self.port if self.port and ssl == self.ssl else (5986 if ssl else 5985)
+        return f'{"https" if ssl else "http"}://{self.host}:{port}/wsman'
+
+    def _emit(self, metrics: CommandMetrics):
+        """Pass command metrics to the metrics hook if specified"""
+
+        if self.metrics_hook is None:
+            return
+
+        try:
+            self.metrics_hook(metrics)
+        except Exception as err:
+            self.logger.warning('Metrics hook error: %s', err)
+
+    def _connect(self, use_cred_ssp: bool = False):
+        """Session with Protocol to the host. HTTPS and CredSSP or the client transport"""
+
+        if use_cred_ssp:
+            return self._protocol(self._endpoint(True), 'credssp')
+        return self._protocol(self._endpoint(self.ssl), self.transport)
+
+    @staticmethod
+    def _signal(protocol, shell_id: str, command_id: str, code: str):
+        """Send signal (ctrl_c, terminate) to the remote command"""
+
+        import xmltodict
+
+        req = {
+            'env:Envelope': protocol._get_soap_header(
+                resource_uri='http://schemas.microsoft.com/wbem/wsman/1/windows/shell/cmd',
+                action='http://schemas.microsoft.com/wbem/wsman/1/windows/shell/Signal',
+                shell_id=shell_id)
+        }
+        signal = req['env:Envelope'].setdefault('env:Body', {}).setdefault('rsp:Signal', {})
+        signal['@CommandId'] = command_id
+        signal['rsp:Code'] = WinOSClient._SIGNAL_URI + code
+        protocol.send_message(xmltodict.unparse(req))
+
+    def _set_timeouts(self, protocol, deadline: float = None):
+        """Fit WSMan operation and HTTP read timeouts into the time left"""
+
+        if deadline is None:
+            return
+
+        remaining = deadline - time.monotonic()
+        operation_timeout = max(1, min(self._MAX_OPERATION_TIMEOUT, int(remaining + 0.999)))
+        protocol.operation_timeout_sec = operation_timeout
+        protocol.transport.read_timeout_sec = operation_timeout + 10
+
+    def _receive(self, protocol, shell_id: str, command_id: str, command: str, timeout: int = None):
+        """Get command output, raise TimeoutExpired if it did not finish in time"""
+
+        from winrm.exceptions import WinRMOperationTimeoutError
+
+        deadline = time.monotonic() + timeout if timeout else None
+        stdout, stderr = [], []
+        done = False
+        return_code = -1
+
+        while not done:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutExpired(command, timeout, b''.join(stdout), b''.join(stderr))
+
+            self._set_timeouts(protocol, deadline)
+            try:
+                out, err, return_code, done = protocol._raw_get_command_output(shell_id, command_id)
+                stdout.append(out)
+                stderr.append(err)
+            except WinRMOperationTimeoutError:
+                # Expected while waiting for a long-running command
+                pass
+
+        return b''.join(stdout), b''.join(stderr), return_code
+
+    def _cancel(self, protocol, shell_id: str, command_id: str):
+        """Stop the remote command and close its shell. Best effort"""
+
+        steps = (
+            ('ctrl_c', lambda: self._signal(protocol, shell_id, command_id, 'ctrl_c')),
+            ('terminate', lambda: protocol.cleanup_command(shell_id, command_id)),
+        ) if command_id else ()
+        steps += (('close shell', lambda: protocol.close_shell(shell_id)),)
+        for name, step in steps:
+            try:
+                step()
+            except Exception as err:
+                self.logger.warning('[%s] Cannot %s command: %s', self.host, name, err)
+
+    def _execute(self, session, command: str, args: tuple, metrics: CommandMetrics,
+                 ps: bool = False, timeout: int = None):
+        """Run command within a new remote shell recording every phase.
+
+        Mirrors winrm.Session.run_cmd / run_ps. If timeout specified, the
+        command is interrupted and its shell closed when it expires.
+        """
+
+        import winrm
+
+        protocol = session.protocol
+        metrics.count_traffic(protocol)
+        original = command
+
+        if ps:
+            encoded_ps = base64.b64encode(command.encode('utf_16_le')).decode('ascii')
+            command = f'powershell -encodedcommand {encoded_ps}'
+
+        if timeout:
+            self._set_timeouts(protocol, time.monotonic() + timeout)
+
+        with metrics.phase('connect'):
+            protocol.transport.build_session()
+        with metrics.phase('open_shell'):
+            shell_id = protocol.open_shell()
+
+        command_id = None
+        try:
+            with metrics.phase('execute'):
+                command_id = protocol.run_command(shell_id, command, args)
+            with metrics.phase('receive'):
+                response = winrm.Response(self._receive(protocol, shell_id, command_id, original, timeout))
+        except BaseException:
+            # Timeout, read timeout, interrupt: do not leave the command running and the shell open
+            with metrics.phase('cleanup'):
+                self._cancel(protocol, shell_id, command_id)
+            raise
+
+        with metrics.phase('cleanup'):
+            protocol.cleanup_command(shell_id, command_id)
+            protocol.close_shell(shell_id)
+
+        if ps and response.std_err:
+            response.std_err = session._clean_error_msg(response.std_err)
+        return response
+
+    def _retry(self, func, metrics: CommandMetrics, hold_shell: bool = False, shell: bool = True):
+        """Call func through the circuit breaker and the scheduler of the host.
+
+        Transport and quota errors are retried with jittered backoff if the
+        command was not sent yet, so a command is never executed twice.
+
+        :param hold_shell: Keep scheduler shell slot after success. Job releases it on close
+        :param shell: Take a scheduler shell slot. False for calls on a long-lived shell, e.g. PSRP pool
+        """
+
+        from requests.exceptions import ConnectionError, ReadTimeout, Timeout
+
+        breaker = self.circuit_breaker
+        scheduler = self.scheduler
+        attempt = 0
+        quota_attempt = 0
+        delay = 0
+
+        while True:
+            if delay:
+                time.sleep(delay)
+            if breaker is not None:
+                breaker.before_call(self.host)
+            acquired = keep_shell = False
+            try:
+                if scheduler is not None:
+                    with metrics.phase('queue'):
+                        scheduler.acquire(self.host, shell)
+                    acquired = True
+
+                try:
+                    result = func()
+                except (ConnectionError, Timeout) as err:
+                    # A long command outliving the read timeout does not mean the host is down
+                    if breaker is not None and not (isinstance(err, ReadTimeout) and 'execute' in metrics.timings):
+                        breaker.record_failure(self.host)
+                    if attempt >= self.retries or 'execute' in metrics.timings:
+                        raise err
+
+                    attempt += 1
+                    metrics.retries += 1
+                    delay = backoff_delay(attempt, self.backoff)
+                    self.logger.warning('[%s] %s. Retry %s/%s in %.2f sec',
+                                        self.host, type(err).__name__, attempt, self.retries, delay)
+                    continue
+                except Exception as err:
+                    # The host responded, so it is alive
+                    if breaker is not None:
+                        breaker.record_success(self.host)
+                    if scheduler is None or not is_quota_error(err):
+                        raise err
+
+                    # The shell of this call still counts: the host rejected it with that many open
+                    scheduler.record_quota_error(self.host)
+                    if quota_attempt >= scheduler.quota_retries or 'execute' in metrics.timings:
+                        raise err
+
+                    quota_attempt += 1
+                    metrics.retries += 1
+                    delay = backoff_delay(quota_attempt, self.backoff)
+                    self.logger.warning('[%s] Quota exceeded, shell limit lowered to %s. Retry %s/%s in %.2f sec',
+                                        self.host, scheduler.limit(self.host), quota_attempt,
+                                        scheduler.quota_retries, delay)
+                    continue
+
+                if breaker is not None:
+                    breaker.record_success(self.host)
+                if scheduler is not None:
+                    keep_shell = hold_shell
+                    scheduler.record_success(self.host)
+                return result
+            finally:
+                # Slots are freed before the retry delay and on any error, including interrupts
+                if acquired:
+                    scheduler.release(self.host, shell=shell and not keep_shell)
+                if breaker is not None:
+                    breaker.end_probe(self.host)  # Interrupted probe must not keep the circuit open
+
     def _client(
             self,
             command: str,
             ps: bool = False,
             cmd: bool = False,
             use_cred_ssp: bool = False,
-            *args) -> ResponseParser:
+            *args,
+            timeout: int = None) -> ResponseParser:
         """The client to send PowerShell or command-line commands
 
         :param command: Command to execute
@@ -204,45 +513,64 @@ class WinOSClient:
         :param cmd: Specify if command-line is used
         :param use_cred_ssp: Specify if CredSSP is used
         :param args: Arguments for command-line
+        :param timeout: Interrupt the command after this number of seconds
         :return:
         """
 
+        from requests.exceptions import ConnectionError
+        from winrm.exceptions import (InvalidCredentialsError,
+                                      WinRMError,
+                                      WinRMTransportError,
+                                      WinRMOperationTimeoutError)
+
         response = None
+        metrics = CommandMetrics(self.host, command)
 
         try:
-            logger.info(f'[{self.host}] ' + command)
+            self.logger.info('[%s] %s', self.host, command)
             if ps:  # Use PowerShell
-                endpoint = (f'https://{self.host}:5986/wsman'
-                            if use_cred_ssp
-                            else f'http://{self.host}:5985/wsman')
-                transport = 'credssp' if use_cred_ssp else 'ntlm'
-                client = self._protocol(endpoint, transport)
-                response = client.run_ps(command)
+                response = self._retry(
+                    lambda: self._execute(
+                        self._connect(use_cred_ssp), command, (), metrics, ps=True, timeout=timeout),
+                    metrics)
             elif cmd:  # Use command-line
-                client = self._protocol(
-                    endpoint=f'http://{self.host}:5985/wsman',
-                    transport='ntlm')
-                response = client.run_cmd(command, [arg for arg in args])
-            return ResponseParser(response)
+                response = self._retry(
+                    lambda: self._execute(self._connect(), command, args, metrics, timeout=timeout),
+                    metrics)
+            return ResponseParser(response, metrics, self.logger)
 
         # Catch exceptions
+        except HostUnavailableError as err:
+            metrics.error = type(err).__name__
+            self.logger.error('Host unavailable: %s', err)
+            raise err
+        except TimeoutExpired as err:
+            metrics.error = type(err).__name__
+            self.logger.error('Timeout exception: %s', err)
+            raise err
         except InvalidCredentialsError as err:
-            logger.error(f'Invalid credentials: {self.username}@{self.password}. {err}')
+            metrics.error = type(err).__name__
+            self.logger.error('Invalid credentials: %s@%s. %s', self.username, self.password, err)
             raise InvalidCredentialsError
         except ConnectionError as err:
-            logger.error('Connection error: ' + str(err))
+            metrics.error = type(err).__name__
+            self.logger.error('Connection error: %s', err)
             raise ConnectionError
         except (WinRMError,
                 WinRMOperationTimeoutError,
                 WinRMTransportError) as err:
-            logger.error('WinRM error: ' + str(err))
+            metrics.error = type(err).__name__
+            self.logger.error('WinRM error: %s', err)
             raise err
         except Exception as err:
-            logger.error('Unhandled error: ' + str(err))
-            logger.error('Try to use "run_cmd_local" method instead.')
+            metrics.error = type(err).__name__
+            self.logger.error('Unhandled error: %s', err)
+            self.logger.error('Try to use "run_cmd_local" method instead.')
             raise err
+        finally:
+            self._emit(metrics)
 
-    def run_cmd(self, command: str, timeout: int = 60, *args) -> ResponseParser:
+    def run_cmd(self, command: str, timeout: int = None, *args) -> ResponseParser:
         """
         Allows to execute cmd command on a remote server.
 
@@ -251,19 +579,41 @@ class WinOSClient:
 
         :param command: command
         :param args: additional command arguments
-        :param timeout: timeout
+        :param timeout: Timeout in sec. Remote command is interrupted and
+            TimeoutExpired raised when it expires. No limit for remote commands
+            and 60 sec for local ones by default
         :return: Object with exit code, stdout and stderr
         """
 
         if self.__local():
-            return self._run_local(command, timeout)
-        return self._client(command, cmd=True, *args)
+            return self._run_local(command, 60 if timeout is None else timeout, hook=self._emit, log=self.logger)
+        return self._client(command, cmd=True, *args, timeout=timeout)
+
+    def _cached(self, key: tuple, func, ttl: float = None) -> ResponseParser:
+        """Return cached successful response or call func if cache enabled"""
+
+        if self.cache is None:
+            return func()
+        return self.cache.get_or_call((self.host,) + key, func, ttl, store=lambda response: response.ok)
+
+    def invalidate_cache(self, match: str = None) -> int:
+        """Drop cached results of this host.
+
+        :param match: Drop only results which command mentions this text. All if not specified
+        :return: Number of entries dropped
+        """
+
+        if self.cache is None:
+            return 0
+        return self.cache.invalidate(self.host, match)
 
     def run_ps(self,
                command: str = None,
                use_cred_ssp: bool = False,
                script: str = None,
-               timeout: int = 60,
+               timeout: int = None,
+               cache_ttl: float = None,
+               compress: bool = None,
                **params) -> ResponseParser:
         """Allows to execute PowerShell command or script using a remote shell and local server.
 
@@ -271,51 +621,214 @@ class WinOSClient:
         :param use_cred_ssp: Use CredSSP.
         :param script: Powershell script full path.
         :param params: Named parameters to be invoked with the script specified.
-        :param timeout: Timeout in sec.
+        :param timeout: Timeout in sec. Remote command is interrupted and
+            TimeoutExpired raised when it expires. No limit for remote commands
+            and 60 sec for local ones by default
+        :param cache_ttl: Cache successful response for this number of seconds.
+            Read-only commands only. Works if client created with cache enabled.
+        :param compress: Gzip stdout of remote command on the host. Client compress_output by default.
+            Output is collected before it is sent, so commands calling "exit" lose it
+
+        Local commands run on a persistent PowerShell host if client created with ps_pool.
+        Remote commands run over the PSRP runspace pool if client created with use_psrp.
         :return: Object with exit code, stdout and stderr
         """
 
+        if cache_ttl is not None and self.cache is not None:
+            key = ('ps', command, script, tuple(sorted(params.items())))
+            return self._cached(
+                key, lambda: self.run_ps(command, use_cred_ssp, script, timeout, compress=compress, **params),
+                cache_ttl)
+
+        if self.__local() and timeout is None:
+            timeout = 60
+
+        if self.__local() and self.ps_pool is not None:
+            return self._run_ps_pool(command, script, timeout, **params)
+
         if self.__local():
             cmd = f'powershell.exe {command}'
+            if command and '\n' in command:
+                # cmd.exe ends the command line at the first newline
+                encoded_ps = base64.b64encode(command.encode('utf_16_le')).decode('ascii')
+                cmd = f'powershell.exe -NoProfile -EncodedCommand {encoded_ps}'
             if script:
                 params_ = ' '.join([f'-{key} {value}' for key, value in params.items()])
                 cmd = f'powershell.exe -file {script} {params_}'
+            return self._run_local(cmd, timeout, hook=self._emit, label='PS', log=self.logger)
+
+        if self.use_psrp and not use_cred_ssp:
+            self.logger.info('[%s] [PSRP] %s', self.host, command)
+            command = self._compressed(command, compress)
+            metrics = CommandMetrics(self.host, command)
+            return self._retry(lambda: self.psrp.run(command, timeout, metrics), metrics, shell=False)
+
+        command = self._compressed(command, compress)
+        return self._client(command, ps=True, use_cred_ssp=use_cred_ssp, timeout=timeout)
+
+    def _compressed(self, command: str, compress: bool = None) -> str:
+        compress = self.compress_output if compress is None else compress
+        return compressed_command(command) if compress else command
+
+    def run_ps_many(self, commands: list, timeout: int = None) -> list:
+        """Execute PowerShell commands concurrently over the PSRP runspace pool.
+
+        pip install pypsrp
+
+        Executes commands one by one locally if host was not specified
+        or host == "localhost/127.0.0.1"
+
+        :param commands: Commands
+        :param timeout: Timeout in sec for all commands
+        :return: List of objects with exit code, stdout and stderr in the order of commands
+        """
 
-            with Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE) as process:
-                logger.info('[LOCAL PS] ' + cmd)
-                process.wait(timeout)
-                stdout, stderr = process.communicate()
-                exitcode = process.wait(timeout=timeout)
-                response = exitcode, stdout, stderr
-                return ResponseParser(response)
+        if self.__local():
+            return [self.run_ps(command, timeout=timeout or 60) for command in commands]
+
+        for command in commands:
+            self.logger.info('[%s] [PSRP] %s', self.host, command)
+        if not commands:
+            return []
+        # The pool is one long-lived shell: pipelines take an operation slot only. Commands
+        # start in order: metrics of the first one tell whether anything was sent
+        metrics = [CommandMetrics(self.host, command) for command in commands]
+        return self._retry(lambda: self.psrp.run_many(commands, timeout, metrics), metrics[0], shell=False)
+
+    def run_script(self, source: str, timeout: int = None, **params) -> ResponseParser:
+        """Execute PowerShell script text stored on the host under its hash.
+
+        The script is uploaded once per host, later calls send its hash and
+        parameters only. Locally the script is saved to the temp directory.
+
+        :param source: Script text, e.g. open('helper.ps1').read()
+        :param timeout: Timeout in sec. No limit for remote scripts and 60 sec for local ones by default
+        :param params: Named parameters of the script
+        :return: Object with exit code, stdout and stderr
+        """
+
+        if self.__local():
+            timeout = 60 if timeout is None else timeout
+            # Stored scripts are ours: run them whatever the execution policy of the machine is
+            path = local_script(source)
+            if self.ps_pool is not None:
+                path_ = path.replace("'", "''")
+                command = f"& ([ScriptBlock]::Create([IO.File]::ReadAllText('{path_}'))) {ps_arguments(params)}"
+                return self._run_ps_pool(command, timeout=timeout)
+            params_ = ' '.join([f'-{key} {value}' for key, value in params.items()])
+            cmd = f'powershell.exe -ExecutionPolicy Bypass -File "{path}" {params_}'
+            return self._run_local(cmd, timeout, hook=self._emit, label='PS', log=self.logger)
+        return self.scripts.run(source, timeout, **params)
+
+    def start_cmd(self, command: str, *args):
+        """Start cmd command without waiting for it to finish.
+
+        Executes command locally if host was not specified
+        or host == "localhost/127.0.0.1"
+
+        :param command: command
+        :param args: additional command arguments
+        :return: Job handle with poll(), read(), result() and cancel() methods
+        """
+
+        if self.__local():
+            return LocalJob(self, command).start()
+        return RemoteJob(self, command, args).start()
 
-        return self._client(command, ps=True, use_cred_ssp=use_cred_ssp)
+    def start_ps(self, command: str, use_cred_ssp: bool = False):
+        """Start PowerShell command without waiting for it to finish.
+
+        :param command: Command
+        :param use_cred_ssp: Use CredSSP.
+        :return: Job handle with poll(), read(), result() and cancel() methods
+        """
+
+        if self.__local():
+            return LocalJob(self, f'powershell.exe {command}', label='PS').start()
+        return RemoteJob(self, command, ps=True, use_cred_ssp=use_cred_ssp).start()
 
     # ---------- Local section ----------
+    def _run_ps_pool(self, command: str = None, script: str = None, timeout: int = 60, **params):
+        """Execute PowerShell command or script on a persistent local PowerShell host"""
+
+        if script:
+            params_ = ' '.join([f'-{key} {value}' for key, value in params.items()])
+            command = f"& '{script}' {params_}"
+
+        metrics = CommandMetrics('localhost', command)
+        try:
+            self.logger.info('[LOCAL PS HOST] %s', command)
+            with metrics.phase('execute'):
+                response = self.ps_pool.run(command, timeout)
+            metrics.bytes_sent = len(command)
+            metrics.bytes_received = len(response[1]) + len(response[2])
+            return ResponseParser(response, metrics, self.logger, encoding='utf-8')
+
+        except TimeoutExpired as err:
+            metrics.error = type(err).__name__
+            self.logger.error('Timeout exception: %s', err)
+            raise err
+        except Exception as err:
+            metrics.error = type(err).__name__
+            raise err
+        finally:
+            self._emit(metrics)
+
+    def run_many_local(self, commands: list, max_workers: int = None, timeout: int = 60) -> list:
+        """Run local commands concurrently.
+
+        :param commands: Commands. A string runs in the shell, an argv list (['git', 'pull']) runs without it
+        :param max_workers: Max commands running at the same time. Number of CPUs by default
+        :param timeout: Timeout of every command in sec. Expired command is killed with its
+            children and its result has metrics.error == 'TimeoutExpired'
+        :return: Objects with exit code, stdout and stderr in completion order. See response.metrics.command
+        """
+
+        return run_many(commands, max_workers, timeout, log=self.logger, hook=self._emit)
+
     @staticmethod
-    def _run_local(cmd: str, timeout: int = 60):
+    def _run_local(cmd: str, timeout: int = 60, hook=None, label: str = 'CMD', log: ClientLogger = default_logger):
         """Main function to send commands using subprocess LOCALLY.
 
         Used command-line (cmd.exe or bash)
 
         :param cmd: string, command
         :param timeout: timeout for command
+        :param hook: Callable to pass command metrics to
+        :param label: Command type to log
+        :param log: Client logger
         :return: Decoded response
 
         """
 
-        with Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE) as process:
-            try:
-                logger.info('[LOCAL CMD] ' + cmd)
-                stdout, stderr = process.communicate(timeout=timeout)
-                exitcode = process.wait(timeout=timeout)
-                response = exitcode, stdout, stderr
-                return ResponseParser(response)
-
-            except TimeoutExpired as err:
-                process.kill()
-                logger.error('Timeout exception: ' + str(err))
-                raise err
+        metrics = CommandMetrics('localhost', cmd)
+
+        try:
+            with metrics.phase('spawn'):
+                process = Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE)
+
+            with process:
+                try:
+                    log.info('[LOCAL %s] %s', label, cmd)
+                    with metrics.phase('execute'):
+                        stdout, stderr = process.communicate(timeout=timeout)
+                        exitcode = process.wait(timeout=timeout)
+                    metrics.bytes_sent = len(cmd)
+                    metrics.bytes_received = len(stdout) + len(stderr)
+                    response = exitcode, stdout, stderr
+                    return ResponseParser(response, metrics, log)
+
+                except TimeoutExpired as err:
+                    process.kill()
+                    log.error('Timeout exception: %s', err)
+                    raise err
+
+        except Exception as err:
+            metrics.error = type(err).__name__
+            raise err
+        finally:
+            if hook:
+                hook(metrics)
 
     @staticmethod
     def get_current_os_name():
@@ -325,7 +838,6 @@ class WinOSClient:
 
     @property
     def is_windows(self):
-        logger.info('sdf')
         return self.get_current_os_name() == 'Windows'
 
     @property
@@ -345,6 +857,23 @@ class WinOSClient:
     def get_content(self, path):
         return self.run_ps(f'Get-Content "{path}"')
 
+    def follow(self, path: str, interval: float = 1.0, from_start: bool = False, encoding: str = 'utf-8'):
+        """Yield lines appended to the file, like "tail -f".
+
+        Only new bytes are read on every poll. Rotated or truncated file is read from the beginning.
+        Use LogFollower to follow many files on many hosts.
+
+        :param path: File path
+        :param interval: Poll interval, sec
+        :param from_start: Yield existing lines first
+        :param encoding: File encoding
+        :return: Generator of lines
+        """
+
+        follower = LogFollower(from_start, encoding=encoding).add(self, path)
+        for entry in follower.follow(interval):
+            yield entry.line
+
     def get_json(self, path: str) -> dict:
         """Read JSON file as string and pretty print it into console """
 
@@ -433,7 +962,7 @@ class WinOSClient:
             last_build = max(all_files, key=os.path.getctime)
             return os.path.basename(last_build)
         except ValueError as err:
-            logger.error(f'{err}. Maybe file with specified criteria not found.')
+            self.logger.error('%s. Maybe file with specified criteria not found.', err)
             return 'File not found. Try another search parameters.'
 
     # noinspection PyUnresolvedReferences
@@ -474,7 +1003,7 @@ class WinOSClient:
         try:
             return os.path.getsize(path)
         except FileNotFoundError as err:
-            logger.error(f'File not found. {err}')
+            logger.error('File not found. %s', err)
             raise err
 
     @staticmethod
@@ -489,6 +1018,8 @@ class WinOSClient:
         Use blank string "" if you do
         """
 
+        import fileinput
+
         with fileinput.FileInput(path, inplace=True, backup=backup) as file:
             for line in file:
                 print(line.replace(old_text, new_text), end='')
@@ -509,6 +1040,8 @@ class WinOSClient:
         :return: File's MD5 hash
         """
 
+        import hashlib
+
         with open(file, 'rb') as f:
             m = hashlib.md5()
             while True:
@@ -581,8 +1114,40 @@ class WinOSClient:
 
         try:
             shutil.copy(source, dst_full)
+            self.invalidate_cache(destination)
         except FileNotFoundError as err:
-            logger.error(f'ERROR occurred during file copy. {err}')
+            self.logger.error('ERROR occurred during file copy. %s', err)
+            raise err
+
+        return self.exists(dst_full)
+
+    def copy_large(self, source: str, destination: str, new_name=None, streams: int = 4,
+                   buffer_size: int = 8 * 1024 * 1024, progress=None, verify: bool = False) -> bool:
+        """Copy large file (e.g. VM image) to a remote windows directory at link speed.
+
+        The copy is preallocated as <name>.part, written by several streams at
+        different offsets, with kernel zero-copy where available, and renamed
+        when complete.
+        Creates destination directory if does not exist.
+
+        :param source: Source file to copy
+        :param destination: Destination directory
+        :param new_name: Copy file with a new name if specified
+        :param streams: Parallel streams
+        :param buffer_size: Bytes per read/write
+        :param progress: Callable(copied, total) to report progress to
+        :param verify: Compare SHA-256 of the source and the copy. CopyVerificationError is raised if they differ
+        :return: Check copied file exists
+        """
+
+        dst_full = os.path.join(destination, new_name or os.path.basename(source))
+        self.create_directory(os.path.dirname(dst_full))
+
+        try:
+            copy_large(source, dst_full, streams, buffer_size, progress, verify)
+            self.invalidate_cache(destination)
+        except FileNotFoundError as err:
+            self.logger.error('ERROR occurred during file copy. %s', err)
             raise err
 
         return self.exists(dst_full)
@@ -594,6 +1159,8 @@ class WinOSClient:
         Creates destination folder if it does not exist
         """
 
+        import zipfile
+
         directory_to_extract_to = target_directory
 
         if not target_directory:
@@ -634,7 +1201,7 @@ class WinOSClient:
         ip_ = host if host else self.host
 
         command = f'ping -{counter} {packets_number} {ip_}'
-        return self._run_local(cmd=command)
+        return self._run_local(cmd=command, hook=self._emit, log=self.logger)
 
     # ---------- Service / process management ----------
     def get_service(self, name: str):
@@ -649,15 +1216,81 @@ class WinOSClient:
 
     def start_service(self, name: str):
         """Start service"""
-        return self.run_ps(f'Start-Service -Name {name}')
+        try:
+            return self.run_ps(f'Start-Service -Name {name}')
+        finally:
+            self.invalidate_cache(name)
 
     def restart_service(self, name: str):
         """Restart service"""
-        return self.run_ps(f'Restart-Service -Name {name}')
+        try:
+            return self.run_ps(f'Restart-Service -Name {name}')
+        finally:
+            self.invalidate_cache(name)
 
     def stop_service(self, name: str):
         """Stop service"""
-        return self.run_ps(f'Stop-Service -Name {name}')
+        try:
+            return self.run_ps(f'Stop-Service -Name {name}')
+        finally:
+            self.invalidate_cache(name)
+
+    def collect_facts(self, categories: list = None, cache_dir: str = None, max_age: float = 3600,
+                      timeout: int = 120) -> HostFacts:
+        """Collect OS, hotfixes, disks, services, processes and network config in one call.
+
+        :param categories: Categories to collect. All of them by default
+        :param cache_dir: Directory to keep snapshots in as <host>.json
+        :param max_age: Return snapshot from cache_dir if it is younger than this number of sec
+        :param timeout: Timeout in sec
+        :return: HostFacts snapshot. Use diff() to compare snapshots
+        """
+
+        categories = list(categories or CATEGORIES)
+        unknown = set(categories) - CATEGORIES.keys()
+        if unknown:
+            raise ValueError(f'Unknown facts categories: {", ".join(sorted(unknown))}')
+
+        host = self.host or 'localhost'
+        path = os.path.join(cache_dir, f'{host}.json') if cache_dir else None
+        if path and os.path.exists(path):
+            snapshot = HostFacts.load(path)
+            if snapshot.age < max_age and set(categories) <= snapshot.facts.keys():
+                return snapshot
+
+        response = self.run_ps(facts_script(categories), timeout=timeout, compress=True)
+        if not response.ok:
+            raise RuntimeError(f'Cannot collect facts from {host}: {response.stderr}')
+
+        data = response.json()
+        snapshot = HostFacts(host, data['facts'], data['errors'])
+        for category, error in snapshot.errors.items():
+            self.logger.warning('[%s] Cannot collect %s facts: %s', host, category, error)
+        if path:
+            snapshot.save(path)
+        return snapshot
+
+    def query_events(self, log: str = 'System', ids: list = None, levels: list = None, since=None,
+                     providers: list = None, max_events: int = None, page_size: int = 500,
+                     bookmark: int = None, include_message: bool = True) -> EventQuery:
+        """Query event log filtered on the host with Get-WinEvent -FilterXPath.
+
+        Events are fetched page by page, oldest first, as the query is iterated:
+        for event in client.query_events('System', levels=['error'], since=timedelta(hours=1)): ...
+
+        :param log: Log name
+        :param ids: Event IDs
+        :param levels: Levels as numbers or names: critical, error, warning, information, verbose
+        :param since: datetime or timedelta back from now
+        :param providers: Provider names
+        :param max_events: Stop after this number of events
+        :param page_size: Events per remote call
+        :param bookmark: Resume after the event with this RecordId. See EventQuery.bookmark
+        :param include_message: Render event messages
+        :return: EventQuery yielding dicts: RecordId, Id, Level, Provider, TimeCreated (UTC ISO), Message
+        """
+
+        return EventQuery(self, log, ids, levels, since, providers, max_events, page_size, bookmark, include_message)
 
     def get_process(self, name: str):
         """Check windows process status"""
@@ -667,18 +1300,27 @@ class WinOSClient:
     def kill_process(self, name: str):
         """Kill windows local service status. Remote and local"""
 
-        return self.run_cmd(f'taskkill -im {name} /f')
+        try:
+            return self.run_cmd(f'taskkill -im {name} /f')
+        finally:
+            self.invalidate_cache(name)
+
+    def wait_service_start(self, name: str, interval: int = 3, timeout: int = 600):
+        """while ((Get-Service -Name ALG).Status -ne "Running"){Start-Sleep 1}
 
-    def wait_service_start(self, name: str, interval: int = 3):
-        """while ((Get-Service -Name ALG).Status -ne "Running"){Start-Sleep 1}"""
+        :param name: Service name
+        :param interval: Check interval, sec
+        :param timeout: Max time to wait, sec
+        """
 
         cmd = f'while ((Get-Service -Name {name}).Status -ne "Running"){{Start-Sleep {interval}}}'
-        return self.run_ps(cmd)
+        return self.run_ps(cmd, timeout=timeout)
 
     def get_service_file_version(self, name: str):
-        """Get FileVersion from the process"""
+        """Get FileVersion from the process. Cached if client created with cache enabled"""
 
-        return self.run_ps(f'(Get-Process -Name {name}).FileVersion')
+        command = f'(Get-Process -Name {name}).FileVersion'
+        return self._cached(('ps', command), lambda: self.run_ps(command))
 
     def is_process_running(self, name: str) -> bool:
         """Check local windows process is running"""
@@ -744,10 +1386,10 @@ class WinOSClient:
         return self.run_cmd(command)
 
     def debug_info(self):
-        logger.info('Linux client created')
-        logger.info(f'Local host: {self.get_current_os_name()}')
-        logger.info(f'Remote IP: {self.host}')
-        logger.info(f'Username: {self.username}')
-        logger.info(f'Password: {self.password}')
-        logger.info(f'Available: {self.is_host_available()}')
-        logger.info(sys.version)
+        self.logger.info('Linux client created')
+        self.logger.info('Local host: %s', self.get_current_os_name())
+        self.logger.info('Remote IP: %s', self.host)
+        self.logger.info('Username: %s', self.username)
+        self.logger.info('Password: %s', self.password)
+        self.logger.info('Available: %s', self.is_host_available())
+        self.logger.info(sys.version)
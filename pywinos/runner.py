@@ -0,0 +1,146 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from pywinos.logs import ClientLogger, default_logger
+from pywinos.metrics import CommandMetrics
+
+
+def new_group() -> dict:
+    """Popen arguments to start the process as leader of its own group, see kill_group()"""
+
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def kill_group(process):
+    """Kill the process with its children. The process must lead its own group"""
+
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError):
+        process.kill()
+
+
+async def _read(stream, buffer: bytearray):
+    """Read the stream to EOF into buffer, so output read before a timeout is kept"""
+
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return
+        buffer.extend(chunk)
+
+
+async def _run(command, timeout: float, semaphore, log: ClientLogger):
+    """Run command. str is run by the shell, list/tuple is executed directly
+
+    :return: ((exit code, stdout, stderr), metrics)
+    """
+
+    import asyncio
+
+    text = command if isinstance(command, str) else subprocess.list2cmdline(command)
+    metrics = CommandMetrics('localhost', text)
+    group = new_group()
+
+    async with semaphore:
+        log.info('[LOCAL %s] %s', 'CMD' if isinstance(command, str) else 'EXEC', text)
+        try:
+            with metrics.phase('spawn'):
+                if isinstance(command, str):
+                    process = await asyncio.create_subprocess_shell(
+                        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **group)
+                else:
+                    process = await asyncio.create_subprocess_exec(
+                        *command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **group)
+        except OSError as err:  # FileNotFoundError, PermissionError
+            metrics.error = type(err).__name__
+            log.error('Cannot run command %r: %s', text, err)
+            metrics.bytes_sent = len(text)
+            return (127, b'', str(err).encode()), metrics
+
+        started = time.perf_counter()
+        stdout, stderr = bytearray(), bytearray()
+        done = asyncio.gather(_read(process.stdout, stdout), _read(process.stderr, stderr), process.wait())
+        try:
+            await asyncio.wait_for(asyncio.shield(done), timeout)
+        except asyncio.TimeoutError:
+            kill_group(process)
+            # Pipes close once the group is dead. A child that left the group may still hold them
+            await asyncio.wait([done], timeout=5)
+            if not done.done():
+                done.cancel()
+                await asyncio.gather(done, process.wait(), return_exceptions=True)
+            metrics.error = 'TimeoutExpired'
+            log.error('Timeout exception: Command %r timed out after %s seconds', text, timeout)
+            stderr.extend(b'\n' * bool(stderr) + f'Timed out after {timeout} seconds'.encode())
+        except BaseException:
+            kill_group(process)
+            done.cancel()
+            await asyncio.gather(done, process.wait(), return_exceptions=True)
+            raise
+        metrics.timings['execute'] = time.perf_counter() - started
+
+    metrics.bytes_sent = len(text)
+    metrics.bytes_received = len(stdout) + len(stderr)
+    return (process.returncode, bytes(stdout), bytes(stderr)), metrics
+
+
+async def _run_all(commands: list, max_workers: int, timeout: float, log: ClientLogger, hook) -> list:
+    import asyncio
+    from pywinos.pywinos import ResponseParser
+
+    semaphore = asyncio.Semaphore(max_workers)
+    tasks = [asyncio.ensure_future(_run(command, timeout, semaphore, log)) for command in commands]
+    results = []
+    try:
+        for task in asyncio.as_completed(tasks):
+            response, metrics = await task
+            if hook:
+                hook(metrics)
+            results.append(ResponseParser(response, metrics, log))
+    except BaseException:
+        # Kill commands still running instead of leaving them behind
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return results
+
+
+def run_many(commands: list, max_workers: int = None, timeout: float = 60,
+             log: ClientLogger = default_logger, hook=None) -> list:
+    """Run local commands concurrently on an asyncio event loop.
+
+    :param commands: Commands. A string runs in the shell, an argv list runs without it
+    :param max_workers: Max commands running at the same time. Number of CPUs by default
+    :param timeout: Timeout of every command, sec. Expired command is killed with its children,
+        output read before is kept
+    :param log: Client logger
+    :param hook: Callable to pass command metrics to
+    :return: ResponseParser list in completion order. metrics.command tells the command.
+        A command that cannot be started has exit code 127
+    """
+
+    import asyncio
+
+    coroutine = _run_all(commands, max_workers or os.cpu_count() or 1, timeout, log, hook)
+    if sys.version_info >= (3, 7) and not (os.name == 'nt' and sys.version_info < (3, 8)):
+        return asyncio.run(coroutine)
+
+    # No asyncio.run before 3.7. Subprocesses on Windows need the proactor loop before 3.8
+    loop = asyncio.ProactorEventLoop() if os.name == 'nt' else asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)  # Attaches the child watcher on POSIX
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
@@ -0,0 +1,298 @@
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from pywinos.logs import logger
+from pywinos.scripts import _powershell
+
+Sample = namedtuple('Sample', 'time value')
+
+# Collects every metric of a host in one call. Process CPU is reported as
+# total processor seconds: the sampler turns it into percent between samples.
+_SAMPLE_SCRIPT = '''$__services = @{{}}
+foreach ($__name in @({services})) {{
+    $__s = Get-Service -Name $__name -ErrorAction SilentlyContinue
+    $__services[$__name] = if ($__s) {{ [string]$__s.Status }} else {{ $null }}
+}}
+$__processes = @{{}}
+foreach ($__name in @({processes})) {{
+    $__p = @(Get-Process -Name $__name -ErrorAction SilentlyContinue)
+    $__processes[$__name] = if ($__p) {{ @{{
+        cpu = [double]($__p | Measure-Object CPU -Sum).Sum
+        memory = [long]($__p | Measure-Object WorkingSet64 -Sum).Sum
+        count = $__p.Count
+    }} }} else {{ $null }}
+}}
+$__disks = @{{}}
+if ({disks}) {{
+    Get-CimInstance Win32_LogicalDisk -Filter 'DriveType=3' | ForEach-Object {{
+        $__disks[$_.DeviceID] = @{{free = [long]$_.FreeSpace; size = [long]$_.Size}}
+    }}
+}}
+ConvertTo-Json -Depth 3 -Compress -InputObject @{{
+    cpus = [Environment]::ProcessorCount; services = $__services; processes = $__processes; disks = $__disks
+}}'''
+
+
+def sample_script(services: list = (), processes: list = (), disks: bool = True) -> str:
+    """Single script collecting service status, process CPU/memory and disk space as compact JSON"""
+
+    return _SAMPLE_SCRIPT.format(
+        services=', '.join(_powershell(name) for name in services),
+        processes=', '.join(_powershell(name) for name in processes),
+        disks='$true' if disks else '$false')
+
+
+class _HostState:
+    __slots__ = ('client', 'base', 'running', 'removed', 'skipped', 'errors', 'series', 'cpu')
+
+    def __init__(self, client, base: float):
+        self.client = client
+        self.base = base
+        self.running = False
+        self.removed = False
+        self.skipped = 0
+        self.errors = 0
+        self.series = {}
+        self.cpu = None  # (monotonic time, {process: processor seconds}) of the previous sample
+
+
+class Sampler:
+    """Samples service status, process CPU and memory, and disk space of many hosts.
+
+    Each host is sampled every interval sec with one remote call. Hosts are
+    spread evenly over the interval and every tick is shifted by a random
+    jitter, so the fleet is not hit in the same second. Ticks follow a fixed
+    grid and do not drift. A tick is skipped if the previous sample of the
+    host is still running or waiting for a worker.
+
+    Recent samples are kept in a ring buffer per host and metric. Metrics:
+    service.<name> (status), process.<name>.cpu (percent of all cores),
+    process.<name>.memory (working set, bytes), process.<name>.count,
+    disk.<drive>.free (bytes), disk.<drive>.free_percent.
+
+    :param services: Service names to sample
+    :param processes: Process names to sample. Instances of a process are summed up
+    :param disks: Sample free space of fixed disks
+    :param interval: Sampling period of every host, sec
+    :param jitter: Random shift of every tick as a fraction of interval
+    :param size: Samples kept per host and metric
+    :param workers: Max hosts sampled at the same time
+    :param timeout: Timeout of a sample call, sec. interval if None
+    :param export: Callable(host, timestamp, values) called with metrics of every sample
+    """
+
+    def __init__(self, services: list = (), processes: list = (), disks: bool = True, interval: float = 60,
+                 jitter: float = 0.1, size: int = 60, workers: int = 32, timeout: float = None, export=None):
+        self.services = list(services)
+        self.processes = list(processes)
+        self.disks = disks
+        self.interval = interval
+        self.jitter = jitter
+        self.size = size
+        self.workers = workers
+        self.timeout = timeout
+        self.export = export
+        self.script = sample_script(self.services, self.processes, disks)
+        self.skipped = 0
+        self._hosts = {}
+        self._queue = []  # (due, sequence, state) heap
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._stopped = True
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def hosts(self) -> list:
+        with self._cond:
+            return list(self._hosts)
+
+    def add(self, client):
+        """Sample the host of the client. The first tick falls at a random point of the interval"""
+
+        with self._cond:
+            old = self._hosts.get(client.host)
+            if old is not None:
+                old.removed = True
+            state = self._hosts[client.host] = _HostState(client, time.monotonic() + random.uniform(0, self.interval))
+            self._schedule(state, state.base)
+        return self
+
+    def remove(self, host: str):
+        with self._cond:
+            state = self._hosts.pop(host, None)
+            if state is not None:
+                state.removed = True
+
+    def _schedule(self, state: _HostState, due: float):
+        heapq.heappush(self._queue, (due, next(self._sequence), state))
+        self._cond.notify()
+
+    def _next_tick(self, state: _HostState, now: float) -> float:
+        """Next grid point after now, shifted by jitter. Ticks missed during a stall are dropped"""
+
+        state.base += self.interval
+        if state.base <= now:
+            state.base += (now - state.base) // self.interval * self.interval + self.interval
+        shift = self.jitter * self.interval
+        return state.base + random.uniform(-shift, shift)
+
+    def start(self):
+        """Start sampling in a background thread"""
+
+        with self._cond:
+            if not self._stopped:
+                return self
+            self._stopped = False
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='pywinos-sampler')
+            self._thread = threading.Thread(target=self._loop, name='pywinos-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True):
+        """Stop scheduling. Waits for samples running if wait is True"""
+
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=wait)
+
+    def _loop(self):
+        with self._cond:
+            while not self._stopped:
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+                due, _, state = self._queue[0]
+                now = time.monotonic()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+
+                heapq.heappop(self._queue)
+                if state.removed:
+                    continue
+                self._schedule(state, self._next_tick(state, now))
+                if state.running:
+                    state.skipped += 1
+                    self.skipped += 1
+                    state.client.logger.debug('[%s] Previous sample is still running. Tick skipped', state.client.host)
+                    continue
+                state.running = True
+                self._executor.submit(self._sample_state, state)
+
+    def _sample_state(self, state: _HostState):
+        try:
+            self._collect(state)
+        finally:
+            with self._cond:
+                state.running = False
+
+    def sample(self, host: str) -> dict:
+        """Sample the host now
+
+        :return: Metric name to value
+        """
+
+        with self._cond:
+            state = self._hosts[host]
+        return self._collect(state)
+
+    def _collect(self, state: _HostState) -> dict:
+        client = state.client
+        try:
+            response = client.run_ps(self.script, timeout=self.timeout or self.interval)
+            if not response.ok:
+                raise RuntimeError(response.stderr)
+            raw = json.loads(response.stdout)
+        except Exception as err:
+            with self._cond:
+                state.errors += 1
+            client.logger.error('[%s] Cannot sample metrics: %s', client.host, err)
+            return {}
+
+        timestamp = time.time()
+        with self._cond:
+            values = self._values(state, raw, time.monotonic())
+            for metric, value in values.items():
+                series = state.series.get(metric)
+                if series is None:
+                    series = state.series[metric] = deque(maxlen=self.size)
+                series.append(Sample(timestamp, value))
+
+        if self.export is not None:
+            try:
+                self.export(client.host, timestamp, values)
+            except Exception as err:
+                logger.warning('Sampler export error: %s', err)
+        return values
+
+    @staticmethod
+    def _values(state: _HostState, raw: dict, now: float) -> dict:
+        """Flat metric values. Process CPU percent is computed from the previous sample"""
+
+        values = {}
+        for name, status in (raw.get('services') or {}).items():
+            values[f'service.{name}'] = status
+
+        previous_time, previous = state.cpu or (None, {})
+        cpu = {}
+        for name, process in (raw.get('processes') or {}).items():
+            if process is None:
+                values[f'process.{name}.count'] = 0
+                continue
+            values[f'process.{name}.memory'] = process['memory']
+            values[f'process.{name}.count'] = process['count']
+            cpu[name] = process['cpu']
+            # Counter goes back when the process restarted: no rate for this sample
+            if name in previous and now > previous_time and cpu[name] >= previous[name]:
+                used = (cpu[name] - previous[name]) / (now - previous_time) / (raw.get('cpus') or 1)
+                values[f'process.{name}.cpu'] = round(used * 100, 2)
+        state.cpu = now, cpu
+
+        for drive, disk in (raw.get('disks') or {}).items():
+            values[f'disk.{drive}.free'] = disk['free']
+            if disk['size']:
+                values[f'disk.{drive}.free_percent'] = round(disk['free'] / disk['size'] * 100, 2)
+        return values
+
+    def series(self, host: str, metric: str) -> list:
+        """Samples kept for the metric, oldest first
+
+        :return: Sample(time, value) list
+        """
+
+        with self._cond:
+            state = self._hosts.get(host)
+            return list(state.series.get(metric, ())) if state else []
+
+    def latest(self, host: str) -> dict:
+        """Last value of every metric of the host"""
+
+        with self._cond:
+            state = self._hosts.get(host)
+            if state is None:
+                return {}
+            return {metric: series[-1].value for metric, series in state.series.items() if series}
+
+    def stats(self, host: str) -> dict:
+        """Skipped ticks and failed samples of the host"""
+
+        with self._cond:
+            state = self._hosts[host]
+            return {'skipped': state.skipped, 'errors': state.errors, 'running': state.running}
@@ -0,0 +1,176 @@
+import re
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# WSMan quota faults: MaxShellsPerUser, MaxConcurrentOperationsPerUser and alike
+_QUOTA_ERROR = re.compile(
+    r'quota|maximum number of \d+ concurrent|MaxShells|MaxConcurrentOperations|MaxProcessesPerShell',
+    re.IGNORECASE)
+
+
+def is_quota_error(err: Exception) -> bool:
+    return bool(_QUOTA_ERROR.search(str(err)))
+
+
+class _Ticket:
+    __slots__ = ('shell', 'granted')
+
+    def __init__(self, shell: bool):
+        self.shell = shell
+        self.granted = False
+
+
+class _Host:
+    __slots__ = ('limit', 'shells', 'operations', 'successes', 'waiters')
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.shells = 0
+        self.operations = 0
+        self.successes = 0
+        self.waiters = deque()
+
+
+class QuotaScheduler:
+    """Paces remote calls to stay within WinRM quotas of every host.
+
+    A call holds an operation slot while it talks to the host, and a shell
+    slot while its shell is open. Waiting calls are granted slots in FIFO
+    order per host and round-robin across hosts, so a busy host does not
+    starve others.
+
+    The shell limit of a host is adapted (AIMD): it is halved on a quota
+    error and raised by one after increase_after successful calls in a row,
+    up to max_shells.
+
+    Share one scheduler across clients: WinOSClient(scheduler=scheduler).
+
+    :param max_shells: Max open shells per host. WinRM MaxShellsPerUser is 30 by default
+    :param max_operations: Max concurrent operations per host. MaxConcurrentOperationsPerUser is 1500 by default
+    :param max_in_flight: Max concurrent operations across all hosts. Unlimited if None
+    :param increase_after: Successful calls in a row to raise the shell limit of a host by one
+    :param quota_retries: Times to retry a call rejected with a quota error before its command was sent
+    """
+
+    def __init__(self, max_shells: int = 30, max_operations: int = 1500, max_in_flight: int = None,
+                 increase_after: int = 10, quota_retries: int = 3):
+        self.max_shells = max_shells
+        self.max_operations = max_operations
+        self.max_in_flight = max_in_flight
+        self.increase_after = increase_after
+        self.quota_retries = quota_retries
+        self.in_flight = 0
+        self.quota_errors = 0
+        self._hosts = {}
+        self._ring = deque()  # Hosts with waiting calls, in turn order
+        self._cond = threading.Condition()
+
+    def _host(self, host: str) -> _Host:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _Host(self.max_shells)
+        return state
+
+    def limit(self, host: str) -> int:
+        """Current shell limit of the host"""
+
+        with self._cond:
+            return self._host(host).limit
+
+    def _fits(self, state: _Host, shell: bool) -> bool:
+        if state.operations >= self.max_operations:
+            return False
+        return not shell or state.shells < min(state.limit, self.max_shells)
+
+    def _dispatch(self):
+        """Grant slots to waiting calls, one call per host in turn"""
+
+        granted = False
+        skipped = 0
+        while self._ring and skipped < len(self._ring):
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                break
+
+            state = self._hosts[self._ring[0]]
+            ticket = state.waiters[0]
+            self._ring.rotate(-1)
+            if not self._fits(state, ticket.shell):
+                skipped += 1
+                continue
+
+            state.waiters.popleft()
+            state.operations += 1
+            state.shells += ticket.shell
+            self.in_flight += 1
+            ticket.granted = granted = True
+            skipped = 0
+            if not state.waiters:
+                self._ring.pop()
+
+        if granted:
+            self._cond.notify_all()
+
+    def acquire(self, host: str, shell: bool = True):
+        """Wait for an operation slot of the host, and a shell slot if shell is True"""
+
+        ticket = _Ticket(shell)
+        with self._cond:
+            state = self._host(host)
+            state.waiters.append(ticket)
+            if len(state.waiters) == 1:
+                self._ring.append(host)
+            self._dispatch()
+            try:
+                while not ticket.granted:
+                    self._cond.wait()
+            except BaseException:
+                # Interrupted wait must not block the calls queued after it
+                if ticket.granted:
+                    state.operations -= 1
+                    state.shells -= ticket.shell
+                    self.in_flight -= 1
+                else:
+                    state.waiters.remove(ticket)
+                    if not state.waiters:
+                        self._ring.remove(host)
+                self._dispatch()
+                raise
+
+    def release(self, host: str, shell: bool = True, operation: bool = True):
+        """Free slots taken by acquire(). Shell may be kept open and released later"""
+
+        with self._cond:
+            state = self._host(host)
+            if operation:
+                state.operations -= 1
+                self.in_flight -= 1
+            if shell:
+                state.shells -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, host: str, shell: bool = True):
+        self.acquire(host, shell)
+        try:
+            yield
+        finally:
+            self.release(host, shell)
+
+    def record_success(self, host: str):
+        with self._cond:
+            state = self._host(host)
+            state.successes += 1
+            if state.successes >= self.increase_after and state.limit < self.max_shells:
+                state.limit += 1
+                state.successes = 0
+                self._dispatch()
+
+    def record_quota_error(self, host: str):
+        """Halve shell limit of the host. Shells in use at the moment show what the host accepts"""
+
+        with self._cond:
+            state = self._host(host)
+            state.limit = max(1, min(state.limit, state.shells) // 2)
+            state.successes = 0
+            self.quota_errors += 1
@@ -0,0 +1,167 @@
+import base64
+import os
+import tempfile
+import uuid
+
+# Printed by the call stub instead of running the script if it is not on the host yet
+MISSING_MARKER = '##PYWINOS-SCRIPT-MISSING##'
+
+# Saved with BOM: Windows PowerShell reads BOM-less scripts in the ANSI code page
+_BOM = b'\xef\xbb\xbf'
+
+
+def _powershell(value) -> str:
+    """Python value as a PowerShell literal"""
+
+    if value is None:
+        return '$null'
+    if isinstance(value, bool):
+        return '$true' if value else '$false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return '@(' + ', '.join(_powershell(item) for item in value) + ')'
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def ps_arguments(params: dict) -> str:
+    """Named parameters as PowerShell arguments: -Name:'value' -Switch:$true"""
+
+    return ' '.join(f'-{key}:{_powershell(value)}' for key, value in params.items())
+
+
+class ScriptRegistry:
+    """Content-addressed cache of PowerShell scripts on a remote host.
+
+    A script is stored on the host as <sha256>.ps1 and called by its hash,
+    so only a short stub with parameters crosses the network. The script
+    is uploaded in chunks the first time the host reports it missing,
+    e.g. after the cache directory was cleaned up.
+
+    :param client: WinOSClient
+    :param directory: Remote cache directory. PowerShell expression in double quotes
+    :param chunk_size: Script bytes per upload command. Keeps commands under cmd.exe 8191 chars limit
+    """
+
+    def __init__(self, client, directory: str = r'$env:TEMP\pywinos\scripts', chunk_size: int = 1800):
+        self.client = client
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.uploads = 0
+        self._sources = {}
+
+    @staticmethod
+    def encode(source: str) -> bytes:
+        return _BOM + source.encode('utf-8')
+
+    def register(self, source: str) -> str:
+        """Remember script locally. Nothing is sent to the host.
+
+        :param source: Script text
+        :return: Script hash
+        """
+
+        import hashlib
+
+        digest = hashlib.sha256(self.encode(source)).hexdigest()
+        self._sources[digest] = source
+        return digest
+
+    def _path(self, digest: str, suffix: str = '.ps1') -> str:
+        return f'$__d = "{self.directory}"; $__p = Join-Path $__d \'{digest}{suffix}\''
+
+    def stub(self, digest: str, params: dict) -> str:
+        """Command to call the stored script with parameters.
+
+        The script text runs as a script block, so execution policy does not apply
+        """
+
+        return (
+            f'{self._path(digest)}; '
+            f"if (-not (Test-Path -LiteralPath $__p)) {{ '{MISSING_MARKER}' }} "
+            f'else {{ & ([ScriptBlock]::Create([IO.File]::ReadAllText($__p))) {ps_arguments(params)} }}'
+        )
+
+    def upload_commands(self, digest: str) -> list:
+        """Commands to upload the script in chunks and move it in place once its hash is verified"""
+
+        data = self.encode(self._sources[digest])
+        part = f'{digest}.{uuid.uuid4().hex[:8]}.part'
+        commands = []
+        for offset in range(0, len(data), self.chunk_size):
+            chunk = base64.b64encode(data[offset:offset + self.chunk_size]).decode('ascii')
+            if not offset:
+                commands.append(
+                    f'{self._path(part, "")}; '
+                    'New-Item -ItemType Directory -Force -Path $__d | Out-Null; '
+                    f"[IO.File]::WriteAllBytes($__p, [Convert]::FromBase64String('{chunk}'))")
+            else:
+                commands.append(
+                    f'{self._path(part, "")}; '
+                    f"$__b = [Convert]::FromBase64String('{chunk}'); "
+                    "$__f = [IO.File]::Open($__p, 'Append'); $__f.Write($__b, 0, $__b.Length); $__f.Close()")
+
+        commands[-1] += (
+            '; '
+            f"if ((Get-FileHash -LiteralPath $__p -Algorithm SHA256).Hash -ne '{digest}') "
+            "{ Remove-Item -LiteralPath $__p; Write-Error 'Script upload corrupted'; exit 1 }; "
+            f"Move-Item -Force -LiteralPath $__p -Destination (Join-Path $__d '{digest}.ps1')")
+        return commands
+
+    def upload(self, digest: str, timeout: int = None):
+        """Upload script to the host.
+
+        :return: ResponseParser of the failed chunk or the last one
+        """
+
+        self.uploads += 1
+        self.client.logger.info('[%s] Uploading script %s', self.client.host, digest)
+        for command in self.upload_commands(digest):
+            response = self.client.run_ps(command, timeout=timeout)
+            if not response.ok:
+                return response
+        return response
+
+    def call(self, digest: str, timeout: int = None, **params):
+        """Run registered script by hash. Uploads it first if the host does not have it.
+
+        :param digest: Script hash returned by register()
+        :param timeout: Timeout in sec of every remote command
+        :param params: Named parameters of the script
+        :return: ResponseParser
+        """
+
+        command = self.stub(digest, params)
+        response = self.client.run_ps(command, timeout=timeout)
+        if response.stdout != MISSING_MARKER:
+            return response
+
+        uploaded = self.upload(digest, timeout)
+        if not uploaded.ok:
+            return uploaded
+        return self.client.run_ps(command, timeout=timeout)
+
+    def run(self, source: str, timeout: int = None, **params):
+        """Register script and run it"""
+
+        return self.call(self.register(source), timeout, **params)
+
+
+def local_script(source: str, directory: str = None) -> str:
+    """Store script in the local cache directory under its hash
+
+    :return: Script path
+    """
+
+    import hashlib
+
+    data = ScriptRegistry.encode(source)
+    directory = directory or os.path.join(tempfile.gettempdir(), 'pywinos', 'scripts')
+    path = os.path.join(directory, hashlib.sha256(data).hexdigest() + '.ps1')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        part = f'{path}.{uuid.uuid4().hex[:8]}.part'
+        with open(part, 'wb') as file:
+            file.write(data)
+        os.replace(part, path)
+    return path
@@ -8,6 +8,10 @@ INSTALL_REQUIRES = [
     'requests>=2.22.0',
 ]
 
+EXTRAS_REQUIRE = {
+    'psrp': ['pypsrp>=0.4.0'],
+}
+
 this_directory = path.abspath(path.dirname(__file__))
 with open(path.join(this_directory, 'README.md'), encoding='utf-8') as f:
     long_description = f.read()
@@ -36,5 +40,9 @@ setup(
         'Topic :: Software Development :: Libraries :: Python Modules'
     ],
     install_requires=INSTALL_REQUIRES,
+    extras_require=EXTRAS_REQUIRE,
+    entry_points={
+        'console_scripts': ['pywinos=pywinos.cli:main'],
+    },
     python_requires='>=3.6',
 )
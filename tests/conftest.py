@@ -1,6 +1,38 @@
+import json
+
 import pytest
 
-from pywinos import WinOSClient
+from pywinos import ResponseParser, WinOSClient
+
+
+class FakeClient(WinOSClient):
+    """Remote client answering run_ps with handler(command) instead of a host.
+
+    handler returns a ResponseParser, or stdout: bytes, str or data dumped as JSON
+    """
+
+    def __init__(self, host: str = 'remote', handler=None):
+        super().__init__(host, logger_enabled=False)
+        self.handler = handler or (lambda command: b'')
+        self.commands = []
+
+    def run_ps(self, command: str = None, **kwargs):
+        self.commands.append(command)
+        result = self.handler(command)
+        if isinstance(result, ResponseParser):
+            return result
+        if not isinstance(result, (bytes, str)):
+            result = json.dumps(result)
+        if isinstance(result, str):
+            result = result.encode()
+        return ResponseParser((0, result, b''))
+
+
+@pytest.fixture
+def fake_client():
+    """FakeClient factory: fake_client(host, handler)"""
+
+    return FakeClient
 
 
 @pytest.fixture
@@ -0,0 +1,62 @@
+import time
+
+from benchmarks.bench import StubWinOSClient
+from benchmarks.stub_wsman import StubWSManServer
+from pywinos import ResponseParser, ResultCache, WinOSClient
+
+
+def test_lru_eviction():
+    cache = ResultCache(maxsize=2)
+    cache.set(('host', 'a'), 1)
+    cache.set(('host', 'b'), 2)
+    cache.get(('host', 'a'))
+    cache.set(('host', 'c'), 3)
+
+    assert ('host', 'a') in cache
+    assert ('host', 'b') not in cache, 'Least recently used entry must be evicted'
+
+
+def test_ttl_expired():
+    cache = ResultCache()
+    cache.set(('host', 'a'), 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get(('host', 'a')) is None
+
+
+def test_invalidate_by_host_and_match():
+    cache = ResultCache()
+    cache.set(('host1', 'ps', 'Get-Service -Name ALG'), 1)
+    cache.set(('host1', 'ps', 'Get-Service -Name Spooler'), 2)
+    cache.set(('host2', 'ps', 'Get-Service -Name ALG'), 3)
+
+    assert cache.invalidate('host1', 'alg') == 1
+    assert cache.size == 2
+
+
+def test_run_ps_cached():
+    with StubWSManServer(output=b'1.2.3') as stub:
+        client = StubWinOSClient('stub-host', stub.endpoint, cache=True)
+        first = client.get_service_file_version('ALG')
+        second = client.get_service_file_version('ALG')
+        client.run_ps('hostname', cache_ttl=60)
+        client.run_ps('hostname', cache_ttl=60)
+
+        assert first.stdout == second.stdout == '1.2.3'
+        assert stub.requests['Command'] == 2, 'Repeated queries must be served from cache'
+
+        client.start_service('ALG')
+        client.get_service_file_version('ALG')
+        assert stub.requests['Command'] == 4, 'start_service must invalidate related entries'
+
+
+def test_invalidate_after_change():
+    client = WinOSClient('host', logger_enabled=False, cache=True)
+
+    def run_ps(command, **kwargs):
+        if command.startswith('Stop-Service'):  # Concurrent read stores the state before the change
+            client.cache.set(('host', 'ps', '(Get-Process -Name ALG).FileVersion'), 'old')
+        return ResponseParser((0, b'', b''))
+
+    client.run_ps = run_ps
+    client.stop_service('ALG')
+    assert client.cache.size == 0, 'Entries cached while the command runs must be dropped'
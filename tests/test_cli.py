@@ -0,0 +1,41 @@
+import io
+import json
+import subprocess
+import sys
+
+import pytest
+
+from pywinos.cli import main, read_hosts
+
+
+def records(output: str) -> list:
+    return [json.loads(line) for line in output.splitlines()]
+
+
+def test_read_hosts():
+    assert list(read_hosts(['host1\n', '\n', '# comment\n', 'host2  # db\n'])) == ['host1', 'host2']
+
+
+def test_hosts_from_stdin(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('localhost\n127.0.0.1\n'))
+    assert main(['--cmd', 'echo hi', '-c', '1']) == 0
+    result = records(capsys.readouterr().out)
+    assert [r['host'] for r in result] == ['localhost', '127.0.0.1']
+    assert all(r['stdout'] == 'hi' and r['exit_code'] == 0 for r in result)
+
+
+def test_failed_host(tmp_path, capsys):
+    hosts = tmp_path / 'hosts.txt'
+    hosts.write_text('localhost\n')
+    assert main(['-H', str(hosts), '--cmd', 'exit 3']) == 1
+    assert records(capsys.readouterr().out)[0]['exit_code'] == 3
+
+
+def test_usage_error():
+    with pytest.raises(SystemExit):
+        main(['--host', 'localhost'])
+
+
+def test_module_entry_point():
+    output = subprocess.check_output([sys.executable, '-m', 'pywinos', '--host', 'localhost', '--cmd', 'echo hi'])
+    assert records(output.decode())[0]['ok']
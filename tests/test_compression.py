@@ -0,0 +1,36 @@
+import base64
+import gzip
+
+from pywinos import ResponseParser, WinOSClient
+from pywinos.compression import COMPRESSED_MARKER, compressed_command
+
+TEXT = '\n'.join(f'Service{i:04} Running Automatic ñ' for i in range(2000))
+
+
+def compressed(text: str) -> bytes:
+    return COMPRESSED_MARKER + base64.b64encode(gzip.compress(text.encode('utf-8'))) + b'\r\n'
+
+
+def test_stdout_decompressed():
+    data = compressed(TEXT)
+    assert len(data) * 5 < len(TEXT)
+    response = ResponseParser((0, data, b''))
+    assert response.stdout == TEXT
+
+
+def test_plain_stdout_untouched():
+    assert ResponseParser((0, b'plain\r\n', b'')).stdout == 'plain'
+
+
+def test_wrapper():
+    command = compressed_command('Get-Service # comment', threshold=10)
+    assert 'Get-Service # comment\nSet-Variable -Name __ok -Value $? -Scope 1\n' in command
+    assert command.index('$?') < command.index('Out-String')
+    assert '-lt 10' in command
+    assert COMPRESSED_MARKER.decode() in command
+
+
+def test_client_default():
+    assert WinOSClient('remote')._compressed('Get-Service') == 'Get-Service'
+    assert WinOSClient('remote', compress_output=True)._compressed('Get-Service') != 'Get-Service'
+    assert WinOSClient('remote', compress_output=True)._compressed('Get-Service', compress=False) == 'Get-Service'
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from pywinos import CopyVerificationError, WinOSClient
+from pywinos.filecopy import copy_large
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'image.vhdx'
+    path.write_bytes(os.urandom(5 * 1024 * 1024 + 123))
+    return str(path)
+
+
+@pytest.mark.parametrize('zero_copy', [True, False])
+@pytest.mark.parametrize('streams', [1, 3])
+def test_copy(source, tmp_path, streams, zero_copy):
+    destination = str(tmp_path / 'copy.vhdx')
+    reports = []
+    copied = copy_large(source, destination, streams=streams, buffer_size=256 * 1024,
+                        progress=lambda done, total: reports.append((done, total)), verify=True, zero_copy=zero_copy)
+
+    size = os.path.getsize(source)
+    assert copied == size
+    assert open(destination, 'rb').read() == open(source, 'rb').read()
+    assert reports[-1] == (size, size)
+    assert [done for done, _ in reports] == sorted(done for done, _ in reports)
+
+
+def test_overwrite_and_empty(tmp_path):
+    empty, destination = tmp_path / 'empty', tmp_path / 'copy'
+    empty.write_bytes(b'')
+    destination.write_bytes(b'old content')
+    assert copy_large(str(empty), str(destination)) == 0
+    assert destination.read_bytes() == b''
+
+
+def test_verification_failed(source, tmp_path, monkeypatch):
+    monkeypatch.setattr('pywinos.filecopy.file_digest', lambda path, size: path)
+    with pytest.raises(CopyVerificationError):
+        copy_large(source, str(tmp_path / 'copy'), verify=True)
+
+
+def test_client_copy_large(source, tmp_path):
+    destination = str(tmp_path / 'share' / 'images')
+    assert WinOSClient(logger_enabled=False).copy_large(source, destination, new_name='new.vhdx')
+    assert os.path.getsize(os.path.join(destination, 'new.vhdx')) == os.path.getsize(source)
+
+
+def test_failed_copy_keeps_destination(source, tmp_path, monkeypatch):
+    destination = tmp_path / 'copy'
+    destination.write_bytes(b'old content')
+    monkeypatch.setattr('pywinos.filecopy.file_digest', lambda path, size: path)
+    with pytest.raises(CopyVerificationError):
+        copy_large(source, str(destination), verify=True)
+    assert destination.read_bytes() == b'old content'
+    assert sorted(os.listdir(str(tmp_path))) == ['copy', 'image.vhdx']
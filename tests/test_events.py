@@ -0,0 +1,61 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+from pywinos import EventQuery
+from pywinos.events import build_xpath
+
+
+def test_xpath():
+    assert build_xpath() == '*'
+    assert build_xpath(ids=[7036, 7040], levels=['error', 3], providers=['Service Control Manager'],
+                       since=datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc), after_record=10) == (
+        '*[System[(EventID=7036 or EventID=7040) and (Level=2 or Level=3) and '
+        'Provider[@Name="Service Control Manager"] and '
+        "TimeCreated[@SystemTime>='2020-01-02T03:04:05.000Z'] and EventRecordID > 10]]")
+    assert build_xpath(levels=['information']) == '*[System[(Level=4 or Level=0)]]'
+    assert build_xpath(since=timedelta(hours=1)) == '*[System[TimeCreated[timediff(@SystemTime) <= 3600000]]]'
+
+
+def events(total):
+    """Handler serving events 1..total filtered by EventRecordID only"""
+
+    def handler(command):
+        after = re.search(r'EventRecordID > (\d+)', command)
+        after = int(after.group(1)) if after else 0
+        count = int(re.search(r'-MaxEvents (\d+)', command).group(1))
+        return [{'RecordId': i, 'Id': 7036} for i in range(after + 1, min(total, after + count) + 1)]
+    return handler
+
+
+def test_stream_pages(fake_client):
+    client = fake_client('remote', events(25))
+    query = client.query_events('System', page_size=10)
+    assert [event['RecordId'] for event in query] == list(range(1, 26))
+    assert len(client.commands) == 3
+    assert query.bookmark == 25
+
+
+def test_resume_from_bookmark(fake_client):
+    client = fake_client('remote', events(25))
+    query = client.query_events(page_size=10, max_events=12)
+    assert [len(page) for page in query.pages()] == [10, 2]
+    assert query.bookmark == 12
+
+    resumed = client.query_events(page_size=10, bookmark=query.bookmark)
+    assert next(iter(resumed))['RecordId'] == 13
+
+
+def test_command():
+    command = EventQuery(None, "Microsoft-Windows-TaskScheduler/Operational", ids=[1], include_message=False).command()
+    assert "-LogName 'Microsoft-Windows-TaskScheduler/Operational'" in command
+    assert "-FilterXPath '*[System[(EventID=1)]]'" in command
+    assert 'Message' not in command
+
+
+def test_since_fixed_per_query(fake_client):
+    client = fake_client('remote', events(25))
+    query = client.query_events(page_size=10, since=timedelta(hours=1))
+    list(query)
+    cutoffs = {re.search(r"@SystemTime>=''([^']+)''", command).group(1) for command in client.commands}
+    assert len(client.commands) == 3
+    assert len(cutoffs) == 1, 'Time window must not move between pages'
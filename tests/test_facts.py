@@ -0,0 +1,84 @@
+import base64
+import json
+
+import pytest
+
+from pywinos import HostFacts, ResponseParser, WinOSClient, diff_fleet
+from pywinos.facts import facts_script
+
+FACTS = {
+    'os': {'Caption': 'Windows Server 2019', 'BuildNumber': '17763', 'LastBootUpTime': '2020-01-01'},
+    'services': [{'Name': 'Spooler', 'Status': 'Running'}, {'Name': 'W32Time', 'Status': 'Stopped'}],
+    'processes': [{'Name': 'svchost', 'Id': 1}, {'Name': 'svchost', 'Id': 2}],
+}
+
+
+def test_script_single_call():
+    script = facts_script(['os', 'services'])
+    assert "$__facts['os'] = Get-CimInstance Win32_OperatingSystem" in script
+    assert "$__facts['services'] = @(Get-Service" in script
+    assert script.startswith("$ErrorActionPreference = 'Stop'")
+    assert 'Get-HotFix' not in script
+    assert script.endswith('-Depth 4 -Compress')
+
+
+def test_diff():
+    old = HostFacts('a', FACTS)
+    facts = json.loads(json.dumps(FACTS))
+    facts['os']['BuildNumber'] = '17764'
+    facts['os']['LastBootUpTime'] = '2020-02-02'
+    facts['services'][1]['Status'] = 'Running'
+    facts['services'].append({'Name': 'Foo', 'Status': 'Running'})
+    facts['processes'] = [{'Name': 'svchost', 'Id': 3}]
+    new = HostFacts('a', facts)
+
+    assert new.diff(old) == {
+        'os': {'added': [], 'removed': [], 'changed': {'os': {'BuildNumber': ('17763', '17764')}}},
+        'services': {'added': ['Foo'], 'removed': [], 'changed': {'W32Time': {'Status': ('Stopped', 'Running')}}},
+        'processes': {'added': ['svchost/3'], 'removed': ['svchost/1', 'svchost/2'], 'changed': {}},
+    }
+    assert new.diff(new) == {}
+    assert list(diff_fleet([old, new, HostFacts('c', FACTS)])) == ['a']
+
+
+def test_save_load(tmp_path):
+    snapshot = HostFacts('a', FACTS, {'hotfixes': 'Access denied'})
+    snapshot.save(str(tmp_path / 'a.json'))
+    loaded = HostFacts.load(str(tmp_path / 'a.json'))
+    assert loaded.as_dict() == snapshot.as_dict()
+    assert loaded.os['Caption'] == 'Windows Server 2019'
+    assert loaded.hotfixes == []
+
+
+def test_collect_facts_cached(tmp_path, fake_client):
+    client = fake_client('remote', lambda command: {'facts': FACTS, 'errors': {}})
+    snapshot = client.collect_facts(['os', 'services'], cache_dir=str(tmp_path))
+    assert snapshot.services[0]['Name'] == 'Spooler'
+    assert client.collect_facts(['os'], cache_dir=str(tmp_path)).as_dict() == snapshot.as_dict()
+    assert len(client.commands) == 1
+
+    client.collect_facts(['os'], cache_dir=str(tmp_path), max_age=0)
+    assert len(client.commands) == 2
+
+
+def test_unknown_category():
+    with pytest.raises(ValueError):
+        WinOSClient('remote').collect_facts(['bios'])
+
+
+def test_collect_facts_local(monkeypatch):
+    commands = []
+
+    def run_local(cmd, *args, **kwargs):
+        commands.append(cmd)
+        return ResponseParser((0, json.dumps({'facts': FACTS, 'errors': {}}).encode(), b''))
+
+    monkeypatch.setattr(WinOSClient, '_run_local', staticmethod(run_local))
+    snapshot = WinOSClient(logger_enabled=False).collect_facts(['os', 'services'])
+    assert snapshot.host == 'localhost'
+
+    command, = commands
+    assert '\n' not in command
+    program, *options, encoded = command.split()
+    assert options == ['-NoProfile', '-EncodedCommand']
+    assert base64.b64decode(encoded).decode('utf_16_le') == facts_script(['os', 'services'])
@@ -0,0 +1,97 @@
+import base64
+import json
+import os
+
+from pywinos import LogFollower, WinOSClient
+
+
+def append(path, text):
+    with open(path, 'ab') as file:
+        file.write(text.encode())
+
+
+def lines(follower):
+    return [entry.line for entry in follower.poll()]
+
+
+def test_follow_local(tmp_path):
+    path = str(tmp_path / 'service.log')
+    append(path, 'old\n')
+    follower = LogFollower().add(WinOSClient(logger_enabled=False), path)
+
+    assert lines(follower) == []
+    append(path, 'one\r\ntwo\npart')
+    assert lines(follower) == ['one', 'two']
+    append(path, 'ial\n')
+    assert lines(follower) == ['partial']
+    assert lines(follower) == []
+
+
+def test_rotation_and_truncation(tmp_path):
+    path = str(tmp_path / 'service.log')
+    append(path, 'first\n')
+    follower = LogFollower(from_start=True).add(WinOSClient(logger_enabled=False), path)
+    assert lines(follower) == ['first']
+
+    os.rename(path, path + '.1')
+    append(path, 'rotated\n')
+    assert lines(follower) == ['rotated']
+
+    with open(path, 'wb'):
+        pass
+    append(path, 'new\n')
+    assert lines(follower) == ['new']
+    assert follower.cursors[''][path].rotations == 2
+
+
+def test_missing_file(tmp_path):
+    path = str(tmp_path / 'missing.log')
+    follower = LogFollower().add(WinOSClient(logger_enabled=False), path)
+    assert lines(follower) == []
+    append(path, 'created\n')
+    assert lines(follower) == ['created'], 'Lines written before the file was noticed must not be lost'
+    append(path, 'appended\n')
+    assert lines(follower) == ['appended']
+
+
+def poll(files):
+    """Handler answering the poll script with files content"""
+
+    def handler(command):
+        result = []
+        for request in json.loads(command.split("'", 2)[1]):
+            if request['p'] not in files:
+                result.append({'p': request['p'], 'e': 'Could not find file', 'n': True})
+                continue
+            data = files[request['p']]
+            start = len(data) if request['o'] < 0 else request['o']
+            result.append({'p': request['p'], 'i': '1', 's': start, 'r': False,
+                           'h': base64.b64encode(data[:64]).decode(), 'd': base64.b64encode(data[start:]).decode()})
+        return result
+    return handler
+
+
+def test_one_call_per_host(fake_client):
+    files = [{'a.log': b'a1\n', 'b.log': b''} for _ in range(3)]
+    hosts = [fake_client(f'host{i}', poll(files[i])) for i in range(3)]
+    follower = LogFollower()
+    for client in hosts:
+        follower.add(client, 'a.log').add(client, 'b.log')
+
+    assert follower.poll() == []
+    for host_files in files:
+        host_files['a.log'] += b'a2\n'
+        host_files['b.log'] += b'b1\n'
+
+    assert sorted(follower.poll()) == sorted(
+        (client.host, path, line) for client in hosts for path, line in (('a.log', 'a2'), ('b.log', 'b1')))
+    assert all(len(client.commands) == 2 for client in hosts)
+    assert follower.cursors['host0']['a.log'].offset == 6
+
+
+def test_missing_remote_file(fake_client):
+    files = {}
+    follower = LogFollower().add(fake_client('host', poll(files)), 'new.log')
+    assert follower.poll() == []
+    files['new.log'] = b'created\n'
+    assert lines(follower) == ['created']
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+from requests.exceptions import ConnectionError
+
+from benchmarks.bench import StubWinOSClient
+from benchmarks.stub_wsman import StubWSManServer
+from pywinos import CircuitBreaker, HostUnavailableError, MetricsCollector
+
+DEAD_ENDPOINT = 'http://127.0.0.1:1/wsman'
+
+
+def test_circuit_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.2)
+    client = StubWinOSClient('dead-host', DEAD_ENDPOINT, circuit_breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            client.run_cmd('whoami')
+    assert breaker.state('dead-host') == breaker.OPEN
+
+    with pytest.raises(HostUnavailableError):
+        client.run_cmd('whoami')
+
+    time.sleep(0.25)
+    with StubWSManServer(output=b'ok') as stub:
+        client.endpoint = stub.endpoint
+        assert client.run_cmd('whoami').ok, 'Probe must go through after cooldown'
+    assert breaker.state('dead-host') == breaker.CLOSED
+
+
+def test_failed_probe_reopens_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.1)
+    client = StubWinOSClient('dead-host', DEAD_ENDPOINT, circuit_breaker=breaker)
+
+    with pytest.raises(ConnectionError):
+        client.run_cmd('whoami')
+    time.sleep(0.15)
+    with pytest.raises(ConnectionError):
+        client.run_cmd('whoami')
+    with pytest.raises(HostUnavailableError):
+        client.run_cmd('whoami')
+
+
+def test_transient_errors_retried():
+    collector = MetricsCollector()
+    client = StubWinOSClient('dead-host', DEAD_ENDPOINT, circuit_breaker=None,
+                             retries=2, backoff=0.01, metrics_hook=collector)
+
+    with pytest.raises(ConnectionError):
+        client.run_cmd('whoami')
+    assert collector.snapshot()['counters']['retries'] == 2
+
+
+def test_interrupted_probe_released():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    client = StubWinOSClient('dead-host', DEAD_ENDPOINT, circuit_breaker=breaker)
+    with pytest.raises(ConnectionError):
+        client.run_cmd('whoami')
+    time.sleep(0.1)
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    client._execute = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        client.run_cmd('whoami')
+    assert breaker.state('dead-host') == breaker.HALF_OPEN
+    breaker.before_call('dead-host')  # Next call may probe
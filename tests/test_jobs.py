@@ -0,0 +1,120 @@
+import os
+import time
+from subprocess import TimeoutExpired
+
+import pytest
+
+from benchmarks.bench import StubWinOSClient
+from benchmarks.stub_wsman import StubWSManServer
+from pywinos import QuotaScheduler, WinOSClient, wait_jobs
+from tests.test_run_many_local import alive
+
+
+def test_remote_job_incremental_output():
+    with StubWSManServer(output=b'line1\r\nline2\r\n', chunk_size=7) as stub:
+        job = StubWinOSClient('job-host', stub.endpoint).start_ps('Install-Something')
+        assert job.state == 'running'
+
+        assert job.read() == 'line1\r\n'
+        response = job.result()
+        assert response.stdout == 'line1\r\nline2'
+        assert job.read() == 'line2\r\n'
+        assert stub.requests['shells_closed'] == 1
+
+
+def test_remote_job_cancel():
+    with StubWSManServer(output=b'late', duration=30) as stub:
+        job = StubWinOSClient('job-host', stub.endpoint).start_cmd('setup.exe /quiet')
+        assert job.poll() is None
+
+        with pytest.raises(TimeoutExpired):
+            job.result(timeout=0.5)
+
+        job.cancel()
+        assert job.state == 'cancelled'
+        command, = stub.commands.values()
+        assert command.signals == ['ctrl_c', 'terminate']
+
+
+def test_wait_many_remote_jobs():
+    with StubWSManServer(output=b'ok', duration=1) as stub:
+        clients = [StubWinOSClient(f'host-{i}', stub.endpoint) for i in range(20)]
+        jobs = [client.start_cmd('whoami') for client in clients]
+
+        finished = wait_jobs(jobs, timeout=30)
+        assert len(finished) == 20
+        assert all(job.result().stdout == 'ok' for job in jobs)
+
+
+def test_finished_job_noticed_among_running():
+    with StubWSManServer(output=b'ok', duration=30) as stub:
+        jobs = [StubWinOSClient(f'host-{i}', stub.endpoint).start_cmd('setup.exe') for i in range(20)]
+        stub.duration = 0.2
+        fast = StubWinOSClient('fast-host', stub.endpoint).start_cmd('whoami')
+
+        start = time.monotonic()
+        finished = wait_jobs(jobs + [fast], timeout=2)
+        assert finished == [fast]
+        assert time.monotonic() - start < 3.5, 'Deadline must not be overshot by a polling pass'
+        for job in jobs:
+            job.cancel()
+
+
+def test_failed_poll_closes_shell():
+    from requests.exceptions import ReadTimeout
+
+    with StubWSManServer(output=b'late', duration=30) as stub:
+        job = StubWinOSClient('job-host', stub.endpoint).start_cmd('setup.exe /quiet')
+
+        def fail(*args, **kwargs):
+            raise ReadTimeout('Read timed out')
+
+        job._session.protocol._raw_get_command_output = fail
+        assert wait_jobs([job], timeout=5) == [job]
+        assert job.state == 'failed'
+        with pytest.raises(ReadTimeout):
+            job.result()
+        command, = stub.commands.values()
+        assert command.signals == ['ctrl_c', 'terminate']
+        assert stub.requests['shells_closed'] == 1
+
+
+def test_failed_cleanup_releases_shell():
+    scheduler = QuotaScheduler()
+    with StubWSManServer(output=b'ok') as stub:
+        job = StubWinOSClient('job-host', stub.endpoint, scheduler=scheduler).start_cmd('whoami')
+
+        def fail(*args, **kwargs):
+            raise ConnectionResetError('Connection reset')
+
+        job._session.protocol.close_shell = fail
+        with pytest.raises(ConnectionResetError):
+            job.result()
+    assert scheduler._hosts['job-host'].shells == 0
+
+
+def test_local_job():
+    job = WinOSClient().start_cmd('echo first && sleep 0.2 && echo second')
+    response = job.result(timeout=10)
+
+    assert response.ok
+    assert response.stdout.split() == ['first', 'second']
+    assert job.read().split() == ['first', 'second']
+
+
+def test_local_job_cancel():
+    job = WinOSClient().start_cmd('sleep 30')
+    job.cancel()
+    assert job.result().exited == -1
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX process groups')
+def test_local_job_cancel_kills_children(tmp_path):
+    pid_file = tmp_path / 'child.pid'
+    job = WinOSClient().start_cmd(f'sleep 30 & echo $! > {pid_file}; wait')
+    while not pid_file.exists() or not pid_file.read_text():
+        time.sleep(0.01)
+    job.cancel()
+
+    time.sleep(0.1)
+    assert not alive(int(pid_file.read_text()))
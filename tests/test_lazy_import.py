@@ -0,0 +1,13 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = ('winrm', 'requests', 'requests_credssp', 'zipfile', 'fileinput', 'hashlib')
+
+
+def test_import_does_not_load_heavy_modules():
+    code = (
+        'import sys; before = set(sys.modules); import pywinos; '
+        f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules and m not in before))'
+    )
+    loaded = subprocess.check_output([sys.executable, '-c', code]).decode().strip()
+    assert not loaded, f'Loaded on import: {loaded}'
@@ -0,0 +1,51 @@
+import logging
+
+import pytest
+
+from pywinos import ResponseParser, WinOSClient
+from pywinos.logs import logger
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def records():
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield handler.messages
+    logger.removeHandler(handler)
+
+
+def test_logger_disabled_per_client(records):
+    quiet = WinOSClient(logger_enabled=False)
+    loud = WinOSClient()
+
+    quiet.run_cmd('hostname')
+    assert not records, 'Disabled client must not log'
+
+    loud.run_cmd('hostname')
+    assert any('[LOCAL CMD] hostname' in message for message in records)
+
+
+def test_payload_truncated(records):
+    client = WinOSClient(log_payload_limit=10)
+    response = ResponseParser((0, b'x' * 100, b''), log=client.logger)
+
+    assert response.stdout == 'x' * 100
+    assert records == ['x' * 10 + '... [90 more chars truncated]']
+
+
+def test_payload_sampled_out(records):
+    client = WinOSClient(log_sample_rate=0.0)
+    response = ResponseParser((1, b'out', b'err'), log=client.logger)
+
+    assert response.stdout == 'out'
+    assert response.stderr == 'err'
+    assert records == ['err'], 'Errors must be logged regardless of sampling'
@@ -0,0 +1,34 @@
+from benchmarks.bench import StubWinOSClient
+from benchmarks.stub_wsman import StubWSManServer
+from pywinos import MetricsCollector, WinOSClient
+
+
+def test_remote_timings():
+    collector = MetricsCollector()
+    with StubWSManServer(output=b'ok') as stub:
+        client = StubWinOSClient('stub-host', stub.endpoint, metrics_hook=collector)
+        response = client.run_ps('whoami')
+
+    assert set(response.timings) == {'connect', 'open_shell', 'execute', 'receive', 'cleanup'}
+    assert response.metrics.bytes_sent > 0
+    assert response.metrics.bytes_received > 0
+    assert collector.snapshot()['counters']['commands'] == 1
+
+
+def test_local_timings():
+    collector = MetricsCollector()
+    response = WinOSClient(metrics_hook=collector).run_cmd('hostname')
+
+    assert set(response.timings) == {'spawn', 'execute'}
+    snapshot = collector.snapshot()
+    assert snapshot['counters']['commands'] == 1
+    assert sum(snapshot['histograms']['total']['counts']) == 1
+
+
+def test_hook_error_does_not_break_command():
+    def hook(metrics):
+        raise ValueError('broken hook')
+
+    with StubWSManServer(output=b'ok') as stub:
+        client = StubWinOSClient('stub-host', stub.endpoint, metrics_hook=hook)
+        assert client.run_cmd('whoami').ok
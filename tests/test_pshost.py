@@ -0,0 +1,86 @@
+import shutil
+import sys
+import textwrap
+from subprocess import TimeoutExpired
+
+import pytest
+
+from pywinos import PowerShellPool, WinOSClient
+
+# Speaks the PowerShell host frame protocol without PowerShell
+FAKE_HOST = textwrap.dedent('''
+    import base64, json, os, sys, time
+
+    for line in sys.stdin:
+        command = base64.b64decode(line).decode()
+        name, _, arg = command.partition(' ')
+        if name == 'exit':
+            sys.exit(int(arg))
+        if name == 'sleep':
+            time.sleep(float(arg))
+        if name == 'write-host':
+            print(arg, flush=True)
+        frame = {'o': str(os.getpid()) if name == 'pid' else arg,
+                 'e': 'failed' if name == 'fail' else '',
+                 'c': 1 if name == 'fail' else 0}
+        frame = base64.b64encode(json.dumps(frame).encode()).decode()
+        print('##PYWINOS-FRAME##' + frame, flush=True)
+''')
+
+
+@pytest.fixture
+def fake_host(tmp_path):
+    path = tmp_path / 'fake_host.py'
+    path.write_text(FAKE_HOST)
+    return [sys.executable, str(path)]
+
+
+def test_host_reused(fake_host):
+    with PowerShellPool(size=1, command=fake_host) as pool:
+        first = pool.run('pid')
+        second = pool.run('pid')
+    assert first == second, 'Same process must execute both scripts'
+
+
+def test_streams_separated(fake_host):
+    with PowerShellPool(size=1, command=fake_host) as pool:
+        assert pool.run('fail') == (1, b'', b'failed')
+        assert pool.run('write-host hello') == (0, b'hello\nhello', b'')
+
+
+def test_restart_after_exit(fake_host):
+    with PowerShellPool(size=1, command=fake_host) as pool:
+        pid = pool.run('pid')[1]
+        assert pool.run('exit 3')[0] == 3
+        assert pool.run('pid')[1] != pid
+        assert pool.restarts == 1
+
+
+def test_recycle_after_max_commands(fake_host):
+    with PowerShellPool(size=1, max_commands=2, command=fake_host) as pool:
+        pids = {pool.run('pid')[1] for _ in range(4)}
+    assert len(pids) == 2
+
+
+def test_timeout_kills_host(fake_host):
+    with PowerShellPool(size=1, command=fake_host) as pool:
+        with pytest.raises(TimeoutExpired):
+            pool.run('sleep 10', timeout=0.5)
+        assert pool.run('echo alive') == (0, b'alive', b'')
+
+
+def test_run_ps_local_pool(fake_host):
+    client = WinOSClient(ps_pool=PowerShellPool(command=fake_host))
+    response = client.run_ps('echo hello')
+    assert response.ok
+    assert response.stdout == 'hello'
+
+
+@pytest.mark.skipif(not (shutil.which('pwsh') or shutil.which('powershell.exe')),
+                    reason='PowerShell is not installed')
+def test_run_ps_local_real_host():
+    client = WinOSClient(ps_pool=True)
+    response = client.run_ps('Write-Output 42; Write-Error boom')
+    assert response.stdout == '42'
+    assert 'boom' in response.stderr
+    assert response.exited == 1
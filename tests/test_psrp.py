@@ -0,0 +1,123 @@
+import threading
+import time
+from subprocess import TimeoutExpired
+
+import pytest
+
+from pywinos import CircuitBreaker, HostUnavailableError, MetricsCollector, PSRPPool, QuotaScheduler, WinOSClient
+
+PSInvocationState = pytest.importorskip('pypsrp.complex_objects').PSInvocationState
+
+
+class FakePowerShell:
+    """Pipeline which script is "<seconds> <output>" or "fail"""
+
+    def __init__(self, pool):
+        self.state = PSInvocationState.NOT_STARTED
+        self.had_errors = False
+        self.output = []
+        self.streams = type('Streams', (), {'error': []})()
+        self.script = ''
+        self.finish_at = 0
+
+    def add_script(self, script):
+        self.script = script
+
+    def begin_invoke(self):
+        self.state = PSInvocationState.RUNNING
+        seconds, _, self.text = self.script.partition(' ')
+        self.finish_at = time.monotonic() + (0 if seconds == 'fail' else float(seconds))
+
+    def poll_invoke(self, timeout=None):
+        # Long poll: the host answers when the pipeline ends or the operation timeout expires
+        time.sleep(max(0, min(timeout or 0.01, self.finish_at - time.monotonic())))
+        if time.monotonic() >= self.finish_at:
+            self.state = PSInvocationState.COMPLETED
+            if self.script == 'fail':
+                self.had_errors = True
+                self.streams.error.append('failed')
+            else:
+                self.output.append(self.text)
+
+    def stop(self):
+        self.state = PSInvocationState.STOPPED
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr('pypsrp.powershell.PowerShell', FakePowerShell)
+    collector = MetricsCollector()
+    pool = PSRPPool('fake', metrics_hook=collector)
+    pool._pool = object()  # Opened
+    pool.collector = collector
+    return pool
+
+
+def test_run_many_concurrent(pool):
+    start = time.monotonic()
+    responses = pool.run_many(['0.3 a', '0.3 b', 'fail'])
+    assert time.monotonic() - start < 0.6
+    assert [r.stdout for r in responses] == ['a', 'b', None]
+    assert [r.exited for r in responses] == [0, 0, 1]
+    assert responses[2].stderr == 'failed'
+    assert pool.collector.counters['commands'] == 3
+
+
+def test_timeout_stops_pipelines(pool, monkeypatch):
+    started = []
+    monkeypatch.setattr(pool, '_begin', lambda script: started.append(PSRPPool._begin(pool, script)) or started[-1])
+    with pytest.raises(TimeoutExpired):
+        pool.run_many(['5 a', '5 b'], timeout=0.1)
+    assert [ps.state for ps in started] == [PSInvocationState.STOPPED] * 2
+
+
+def test_client_pool_config():
+    client = WinOSClient('remote', 'user', 'pass', logger_enabled=False, psrp_pool_size=2, psrp_init_script='ipmo X')
+    assert client.psrp is client.psrp
+    assert (client.psrp.host, client.psrp.size, client.psrp.init_script) == ('remote', 2, 'ipmo X')
+    assert not client.psrp.opened
+
+
+def test_run_ps_many_local():
+    client = WinOSClient(logger_enabled=False)
+    assert len(client.run_ps_many([])) == 0
+
+
+def test_callers_take_turns(pool):
+    slow = threading.Thread(target=pool.run, args=('3 a',))
+    slow.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    assert pool.run('0.1 b').stdout == 'b'
+    assert time.monotonic() - start < 2, 'Another pipeline must hold the pool for one poll only'
+    slow.join()
+
+
+def test_warm_every_runspace(monkeypatch):
+    pool = PSRPPool('fake', size=3, init_script='Import-Module X')
+    scripts = []
+    monkeypatch.setattr(pool, 'run_many', lambda batch, timeout=None, metrics=None: scripts.extend(batch) or [
+        type('Response', (), {'ok': True})() for _ in batch])
+    pool._warm()
+
+    assert 'CountdownEvent 3' in scripts[0]
+    assert len([script for script in scripts if 'Import-Module X' in script]) == 3
+    assert scripts[-1].endswith('$null)')
+
+
+def test_client_circuit_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure('remote')
+    client = WinOSClient('remote', logger_enabled=False, use_psrp=True, circuit_breaker=breaker)
+    with pytest.raises(HostUnavailableError):
+        client.run_ps('hostname')
+    assert not client.psrp.opened
+
+
+def test_client_takes_no_shell_slot(monkeypatch):
+    scheduler = QuotaScheduler(max_shells=1)
+    scheduler.acquire('remote')  # The only shell is taken
+    client = WinOSClient('remote', logger_enabled=False, use_psrp=True, circuit_breaker=None, scheduler=scheduler)
+    monkeypatch.setattr(client.psrp, 'run', lambda command, timeout, metrics: command)
+    assert client.run_ps('hostname') == 'hostname'
+    assert scheduler._hosts['remote'].operations == 1
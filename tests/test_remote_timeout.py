@@ -0,0 +1,60 @@
+import time
+from subprocess import TimeoutExpired
+
+import pytest
+
+from benchmarks.bench import StubWinOSClient
+from benchmarks.stub_wsman import StubWSManServer
+from pywinos import CircuitBreaker
+
+
+def test_remote_timeout_cancels_command():
+    with StubWSManServer(output=b'late', duration=30) as stub:
+        client = StubWinOSClient('slow-host', stub.endpoint)
+
+        start = time.monotonic()
+        with pytest.raises(TimeoutExpired):
+            client.run_cmd('ping -t 127.0.0.1', timeout=1)
+        assert time.monotonic() - start < 5, 'Timeout is not honored'
+
+        command, = stub.commands.values()
+        assert command.signals == ['ctrl_c', 'terminate']
+        assert stub.requests['shells_closed'] == 1
+
+
+def test_remote_command_within_timeout():
+    with StubWSManServer(output=b'done', duration=1.5) as stub:
+        response = StubWinOSClient('slow-host', stub.endpoint).run_ps('Start-Sleep 1', timeout=10)
+        assert response.stdout == 'done'
+
+
+def test_receive_error_cancels_command(monkeypatch):
+    from requests.exceptions import ReadTimeout
+
+    def fail(*args, **kwargs):
+        raise ReadTimeout('Read timed out')
+
+    with StubWSManServer(output=b'late', duration=30) as stub:
+        client = StubWinOSClient('slow-host', stub.endpoint)
+        monkeypatch.setattr(client, '_receive', fail)
+        with pytest.raises(ReadTimeout):
+            client.run_cmd('ping -t 127.0.0.1', timeout=10)
+
+        command, = stub.commands.values()
+        assert command.signals == ['ctrl_c', 'terminate']
+        assert stub.requests['shells_closed'] == 1
+
+
+def test_read_timeout_after_execute_keeps_circuit_closed(monkeypatch):
+    from requests.exceptions import ReadTimeout
+
+    def fail(*args, **kwargs):
+        raise ReadTimeout('Read timed out')
+
+    breaker = CircuitBreaker(failure_threshold=1)
+    with StubWSManServer(output=b'late', duration=30) as stub:
+        client = StubWinOSClient('slow-host', stub.endpoint, circuit_breaker=breaker)
+        monkeypatch.setattr(client, '_receive', fail)
+        with pytest.raises(ReadTimeout):
+            client.run_cmd('ping -t 127.0.0.1')
+    assert breaker.state('slow-host') == 'closed'
@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+
+import pytest
+
+from pywinos import MetricsCollector, WinOSClient
+from pywinos.runner import run_many
+
+PY = sys.executable
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    try:
+        with open(f'/proc/{pid}/stat') as stat:
+            return stat.read().rsplit(')', 1)[1].split()[0] != 'Z'  # Zombie waits for init to reap it
+    except OSError:
+        return True
+
+
+def test_concurrent_in_completion_order():
+    client = WinOSClient(logger_enabled=False)
+    started = time.monotonic()
+    commands = [[PY, '-c', 'import time; time.sleep(0.5); print("slow")']] + \
+               [[PY, '-c', 'import time; time.sleep(0.2); print("fast")']] * 3
+    responses = client.run_many_local(commands, max_workers=4)
+    assert time.monotonic() - started < 1.2
+    assert [r.stdout for r in responses] == ['fast'] * 3 + ['slow']
+
+
+def test_shell_and_argv():
+    client = WinOSClient(logger_enabled=False)
+    responses = client.run_many_local(['echo shell', [PY, '-c', 'import sys; sys.exit(3)']], max_workers=1)
+    assert sorted(r.exited for r in responses) == [0, 3]
+    assert {r.metrics.command: r.exited for r in responses}['echo shell'] == 0
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX process groups')
+def test_timeout_kills_process_group(tmp_path):
+    pid_file = tmp_path / 'child.pid'
+    collector = MetricsCollector()
+    client = WinOSClient(logger_enabled=False, metrics_hook=collector)
+
+    started = time.monotonic()
+    response, = client.run_many_local([f'sleep 30 & echo $! > {pid_file}; wait'], timeout=0.5)
+    assert time.monotonic() - started < 5
+    assert response.metrics.error == 'TimeoutExpired'
+    assert not response.ok
+    assert collector.counters['errors'] == 1
+
+    time.sleep(0.1)
+    assert not alive(int(pid_file.read_text()))
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='Proactor loop branch')
+def test_without_asyncio_run(monkeypatch):
+    import asyncio
+
+    monkeypatch.delattr(asyncio, 'run')  # Python 3.6
+    monkeypatch.setattr('pywinos.runner.sys', type('sys', (), {'version_info': (3, 6, 15)}))
+    responses = WinOSClient(logger_enabled=False).run_many_local([[PY, '-c', 'print("ok")']])
+    assert [response.stdout for response in responses] == ['ok']
+
+
+def test_missing_binary():
+    client = WinOSClient(logger_enabled=False)
+    started = time.monotonic()
+    responses = client.run_many_local([['sleep', '1'], ['no-such-binary-xyz']], max_workers=2)
+    assert time.monotonic() - started < 3
+    missing, sleep = responses
+    assert missing.exited == 127
+    assert missing.metrics.error == 'FileNotFoundError'
+    assert 'no-such-binary-xyz' in missing.stderr
+    assert sleep.ok
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX process groups')
+def test_timeout_keeps_partial_output():
+    client = WinOSClient(logger_enabled=False)
+    response, = client.run_many_local([[PY, '-u', '-c', 'import time; print("started"); time.sleep(30)']], timeout=1)
+    assert response.metrics.error == 'TimeoutExpired'
+    assert response.stdout == 'started'
+    assert 'Timed out after 1 seconds' in response.stderr
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX process groups')
+def test_failed_hook_kills_pending(tmp_path):
+    pid_file = tmp_path / 'child.pid'
+
+    def hook(metrics):
+        raise RuntimeError('hook failed')
+
+    with pytest.raises(RuntimeError):
+        run_many(['true', f'echo $$ > {pid_file}; exec sleep 30'], max_workers=2, hook=hook)
+
+    time.sleep(0.1)
+    assert not alive(int(pid_file.read_text()))
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from pywinos import ResponseParser, Sampler
+from pywinos.sampler import sample_script
+
+
+class Metrics:
+    """Handler answering the sample script. Tracks overlapping calls"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.cpu = 0.0
+        self.lock = threading.Lock()
+        self.running = 0
+        self.overlapped = False
+
+    def __call__(self, command):
+        with self.lock:
+            self.running += 1
+            self.overlapped |= self.running > 1
+            self.cpu += 2.0
+            cpu = self.cpu
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return {
+            'cpus': 4,
+            'services': {'Spooler': 'Running'},
+            'processes': {'svchost': {'cpu': cpu, 'memory': 1024, 'count': 3}, 'missing': None},
+            'disks': {'C:': {'free': 25, 'size': 100}},
+        }
+
+
+def test_script_single_call():
+    script = sample_script(['Spooler'], ["o'brien"], disks=False)
+    assert "@('Spooler')" in script
+    assert "@('o''brien')" in script
+    assert 'if ($false)' in script
+    assert script.count('ConvertTo-Json') == 1
+
+
+def test_sample_values(fake_client):
+    sampler = Sampler(['Spooler'], ['svchost', 'missing'], size=2)
+    sampler.add(fake_client('a', Metrics()))
+    first = sampler.sample('a')
+    assert first == {
+        'service.Spooler': 'Running', 'process.svchost.memory': 1024, 'process.svchost.count': 3,
+        'process.missing.count': 0, 'disk.C:.free': 25, 'disk.C:.free_percent': 25.0,
+    }
+    second = sampler.sample('a')
+    assert second['process.svchost.cpu'] > 0
+
+    sampler.sample('a')
+    assert len(sampler.series('a', 'disk.C:.free')) == 2
+    assert sampler.latest('a')['service.Spooler'] == 'Running'
+
+
+def test_next_tick_keeps_grid(fake_client):
+    sampler = Sampler(interval=10, jitter=0.1)
+    sampler.add(fake_client('a', Metrics()))
+    state = sampler._hosts['a']
+    base = state.base
+    for tick in range(1, 50):
+        due = sampler._next_tick(state, state.base)
+        assert abs(due - (base + tick * 10)) <= 1
+    now = state.base + 35
+    assert sampler._next_tick(state, now) >= now - 1  # Missed ticks are dropped, not caught up
+
+
+def test_skip_while_running_and_export(fake_client):
+    exported = []
+    sampler = Sampler(['Spooler'], interval=0.05, jitter=0.2, workers=4,
+                      export=lambda host, timestamp, values: exported.append(host))
+    slow_metrics = Metrics(delay=0.3)
+    slow, fast = fake_client('slow', slow_metrics), fake_client('fast', Metrics())
+    sampler.add(slow).add(fast)
+    with sampler:
+        time.sleep(0.7)
+
+    assert not slow_metrics.overlapped
+    assert sampler.stats('slow')['skipped'] > 0
+    assert len(fast.commands) > len(slow.commands)
+    assert exported.count('fast') == len(fast.commands)
+    assert sorted(sampler.hosts) == ['fast', 'slow']
+
+
+def test_failed_sample(fake_client):
+    client = fake_client('a', lambda command: ResponseParser((1, b'', b'Access denied')))
+    sampler = Sampler()
+    sampler.add(client)
+    assert sampler.sample('a') == {}
+    assert sampler.stats('a')['errors'] == 1
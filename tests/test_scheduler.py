@@ -0,0 +1,129 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.bench import StubWinOSClient
+from benchmarks.stub_wsman import StubWSManServer
+from pywinos import CommandMetrics, QuotaScheduler, WinOSClient
+
+QUOTA_ERROR = 'The WS-Management service cannot process the request. ' \
+              'This user is allowed a maximum number of 5 concurrent shells, which has been exceeded.'
+
+
+def test_shell_limit_per_host():
+    scheduler = QuotaScheduler(max_shells=2)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def call(_):
+        with scheduler.slot('host'):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(call, range(16)))
+    assert max(peak) == 2
+    assert scheduler.in_flight == 0
+
+
+def test_fair_order_across_hosts():
+    scheduler = QuotaScheduler(max_in_flight=1)
+    scheduler.acquire('busy')  # Hold the only slot
+    order = []
+
+    def call(host):
+        with scheduler.slot(host):
+            order.append(host)
+
+    threads = []
+    for host in ['busy'] * 4 + ['idle']:
+        threads.append(threading.Thread(target=call, args=(host,)))
+        threads[-1].start()
+        time.sleep(0.02)  # Queue in this order
+
+    scheduler.release('busy')
+    for thread in threads:
+        thread.join()
+    assert order.index('idle') == 1
+
+
+def test_aimd():
+    scheduler = QuotaScheduler(max_shells=8, increase_after=3)
+    for _ in range(6):
+        scheduler.acquire('host')
+    scheduler.record_quota_error('host')
+    assert scheduler.limit('host') == 3
+    for _ in range(6):
+        scheduler.release('host')
+
+    for _ in range(6):
+        scheduler.record_success('host')
+    assert scheduler.limit('host') == 5
+
+
+def test_quota_error_retried():
+    scheduler = QuotaScheduler(max_shells=4)
+    client = WinOSClient('remote', logger_enabled=False, circuit_breaker=None, backoff=0, scheduler=scheduler)
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) == 1:
+            raise Exception(QUOTA_ERROR)
+        return 'ok'
+
+    metrics = CommandMetrics()
+    assert client._retry(func, metrics) == 'ok'
+    assert metrics.retries == 1
+    assert scheduler.limit('remote') == 1
+    assert scheduler.in_flight == 0
+    assert 'queue' in metrics.timings
+
+
+def test_remote_commands_and_jobs():
+    scheduler = QuotaScheduler(max_shells=1)
+    with StubWSManServer(output=b'ok') as stub:
+        client = StubWinOSClient('stub', stub.endpoint, circuit_breaker=None, scheduler=scheduler)
+        with ThreadPoolExecutor(4) as executor:
+            assert all(r.ok for r in executor.map(lambda _: client.run_cmd('whoami'), range(4)))
+
+        job = client.start_cmd('whoami')
+        assert scheduler.in_flight == 0
+        job.result()
+    assert scheduler.in_flight == 0
+    assert scheduler._hosts['stub'].shells == 0
+
+
+def test_quota_error_counts_own_shell():
+    scheduler = QuotaScheduler(max_shells=8, quota_retries=0)
+    client = WinOSClient('remote', logger_enabled=False, circuit_breaker=None, backoff=0, scheduler=scheduler)
+    for _ in range(3):
+        scheduler.acquire('remote')  # Shells of other calls in flight
+
+    def func():
+        raise Exception(QUOTA_ERROR)
+
+    with pytest.raises(Exception, match='maximum number of 5'):
+        client._retry(func, CommandMetrics())
+    assert scheduler.limit('remote') == 2  # Rejected with 4 shells open
+    assert scheduler._hosts['remote'].shells == 3
+
+
+def test_slot_released_on_interrupt():
+    scheduler = QuotaScheduler(max_shells=1)
+    client = WinOSClient('remote', logger_enabled=False, circuit_breaker=None, scheduler=scheduler)
+
+    def func():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        client._retry(func, CommandMetrics())
+    assert scheduler.in_flight == 0
+    assert scheduler._hosts['remote'].shells == 0
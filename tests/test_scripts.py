@@ -0,0 +1,77 @@
+import base64
+import hashlib
+import re
+
+from pywinos import ScriptRegistry, WinOSClient
+from pywinos.scripts import MISSING_MARKER, _powershell, local_script, ps_arguments
+
+SCRIPT = 'param($Name, [switch]$Force)\n' + '# padding ñ\n' * 500 + 'Write-Output "Hello $Name"'
+
+
+class Files:
+    """Remote host keeping uploaded scripts in memory"""
+
+    def __init__(self):
+        self.files = {}
+        self.parts = {}
+
+    def __call__(self, command):
+        name = re.search(r"Join-Path \$__d '([^']+)'", command).group(1)
+        for chunk in re.findall(r"FromBase64String\('([^']*)'\)", command):
+            self.parts[name] = self.parts.get(name, b'') + base64.b64decode(chunk)
+        if 'Move-Item' in command:
+            data = self.parts.pop(name)
+            self.files[name.split('.')[0] + '.ps1'] = data
+        elif name.endswith('.ps1'):
+            return 'ok' if name in self.files else MISSING_MARKER
+        return b''
+
+
+def test_powershell_literals():
+    assert _powershell("it's") == "'it''s'"
+    assert _powershell(True) == '$true'
+    assert _powershell(None) == '$null'
+    assert _powershell([1, 'a']) == "@(1, 'a')"
+    assert ps_arguments({'Name': 'x', 'Count': 3}) == "-Name:'x' -Count:3"
+
+
+def test_upload_once(fake_client):
+    files = Files()
+    host = fake_client('remote', files)
+    registry = ScriptRegistry(host)
+
+    assert registry.run(SCRIPT, Name='a').stdout == 'ok'
+    uploaded = len(host.commands)
+    assert uploaded > 3  # Stub, several chunks, stub again
+
+    digest = registry.register(SCRIPT)
+    data = files.files[digest + '.ps1']
+    assert data == registry.encode(SCRIPT)
+    assert hashlib.sha256(data).hexdigest() == digest
+
+    assert registry.run(SCRIPT, Name='b', Force=True).stdout == 'ok'
+    assert len(host.commands) == uploaded + 1
+    assert registry.uploads == 1
+    assert len(host.commands[-1]) < 300
+    assert "-Name:'b' -Force:$true }" in host.commands[-1]
+    assert '& ([ScriptBlock]::Create([IO.File]::ReadAllText($__p)))' in host.commands[-1]
+
+
+def test_reupload_when_missing(fake_client):
+    files = Files()
+    registry = ScriptRegistry(fake_client('remote', files))
+    registry.run(SCRIPT)
+    files.files.clear()
+    assert registry.run(SCRIPT).stdout == 'ok'
+    assert registry.uploads == 2
+
+
+def test_local_script_bypasses_execution_policy(monkeypatch):
+    commands = []
+    monkeypatch.setattr(WinOSClient, '_run_local', staticmethod(lambda cmd, *args, **kwargs: commands.append(cmd)))
+    client = WinOSClient(logger_enabled=False)
+    client.run_script(SCRIPT, Days=7)
+    client.run_ps(script='audit.ps1', Days=7)
+    path = local_script(SCRIPT)
+    assert commands == [f'powershell.exe -ExecutionPolicy Bypass -File "{path}" -Days 7',
+                        'powershell.exe -file audit.ps1 -Days 7']
@@ -0,0 +1,24 @@
+import pytest
+
+from benchmarks.bench import StubWinOSClient
+from benchmarks.stub_wsman import StubWSManServer
+
+
+@pytest.fixture
+def stub():
+    with StubWSManServer(output=b'stub-host\\administrator\r\n', chunk_size=8) as server:
+        yield server
+
+
+def test_run_cmd_stub(stub):
+    response = StubWinOSClient('stub-host', stub.endpoint).run_cmd('whoami')
+    assert response.ok, 'Response is not OK'
+    assert response.stdout == 'stub-host\\administrator'
+    assert stub.requests['Create'] == 1
+    assert stub.requests['Delete'] == 1
+
+
+def test_run_ps_stub_exit_code(stub):
+    stub.exit_code = 3
+    response = StubWinOSClient('stub-host', stub.endpoint).run_ps('whoami')
+    assert response.exited == 3, 'Exit code is not 3'
@@ -0,0 +1,43 @@
+from pywinos import WinOSClient
+
+
+def protocol(client, use_cred_ssp=False):
+    return client._connect(use_cred_ssp).protocol
+
+
+def test_default_http_ntlm():
+    client = WinOSClient('host', 'user', 'pass')
+    assert protocol(client).transport.endpoint == 'http://host:5985/wsman'
+    assert protocol(client).transport.auth_method == 'ntlm'
+
+
+def test_https_without_message_encryption():
+    client = WinOSClient('host', 'user', 'pass', transport='kerberos', ssl=True, port=443)
+    transport = protocol(client).transport
+    assert transport.endpoint == 'https://host:443/wsman'
+    assert transport.auth_method == 'kerberos'
+    assert transport.message_encryption == 'auto'
+
+
+def test_cred_ssp_keeps_default_port():
+    client = WinOSClient('host', 'user', 'pass', port=8080)
+    transport = protocol(client, use_cred_ssp=True).transport
+    assert transport.endpoint == 'https://host:5986/wsman'
+    assert transport.auth_method == 'credssp'
+
+
+def test_certificate_auth(tmp_path):
+    cert, key = str(tmp_path / 'c.pem'), str(tmp_path / 'k.pem')
+    for path in cert, key:
+        open(path, 'w').close()
+    client = WinOSClient('host', transport='certificate', ssl=True, cert_pem=cert, cert_key_pem=key,
+                         cert_validation=True)
+    transport = protocol(client).transport
+    assert (transport.cert_pem, transport.cert_key_pem) == (cert, key)
+    assert transport.server_cert_validation == 'validate'
+
+
+def test_psrp_pool_config():
+    client = WinOSClient('host', transport='plaintext', ssl=True, port=5999, message_encryption='never')
+    pool = client.psrp
+    assert (pool.ssl, pool.port, pool.auth, pool.encryption) == (True, 5999, 'basic', 'never')